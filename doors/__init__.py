@@ -0,0 +1,10 @@
+# Module generating each door's sequence, run with `python -m <module>`.
+DOOR_GENERATORS = {
+    "5x5hip_jank": "doors.hip.hip5jank",
+    "6x6hip": "doors.hip.hip6",
+    "7x7hip": "doors.hip.hip789",
+    "8x8hip": "doors.hip.hip789",
+    "9x9hip": "doors.hip.hip789",
+    "10x10hip": "doors.hip.hip10",
+    "10x10hipnew": "doors.hip.hip10new",
+}
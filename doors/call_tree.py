@@ -1,65 +1,289 @@
+import bisect
 import functools
-from typing import Union, NamedTuple
+import io
+import os
+from array import array
+from typing import Any, Iterator, TextIO, Union, NamedTuple
 from typing import Callable
 from typing import cast
 import dataclasses
+from enum import Enum
 
 
 CallNode = Union["MessageNode", "MethodNode"]
 
+# set to 0 to run door generators without recording call trees
+TRACE_ENV = "DOORS_TRACE"
 
-class MessageNode:
-    parent: "MethodNode | None" = None
+# kinds of call tree events
+METHOD = 0
+MESSAGE = 1
 
-    def __init__(self, message: str):
-        self.message = message
+
+# arguments of these types can't change after a call and always format the same when
+# equal, so calls with only these are interned and formatted with the tree
+_PRIMITIVE_TYPES = {int, bool, float, str, type(None)}
+
+
+def _is_primitive(arg_type: type) -> bool:
+    if arg_type in _PRIMITIVE_TYPES:
+        return True
+    if issubclass(arg_type, Enum):
+        _PRIMITIVE_TYPES.add(arg_type)
+        return True
+    return False
+
+
+def tracing_enabled() -> bool:
+    return os.environ.get(TRACE_ENV, "1").lower() not in ("0", "false", "no", "off")
 
 
 class MethodCall(NamedTuple):
     method_name: str
-    args: list[str]
+    args: tuple[str, ...]
 
     def __str__(self) -> str:
         args_str = ", ".join(self.args)
         return f"{self.method_name}({args_str})"
 
+    @classmethod
+    def format(cls, method_name: str, args: tuple, kwargs: dict) -> "MethodCall":
+        return cls(
+            method_name, (*map(str, args), *(f"{k}={v}" for k, v in kwargs.items()))
+        )
 
-class MethodNode:
-    parent: "MethodNode | None" = None
 
-    def __init__(self, call_name: MethodCall | None):
-        self.call_name = call_name
-        self.children: list[CallNode] = []
+class RawCall(NamedTuple):
+    """A call whose arguments haven't been turned into text yet."""
 
-    def add_child(self, child: CallNode):
-        child.parent = self
-        self.children.append(child)
+    method_name: str
+    args: tuple
+    kwargs: dict
 
 
 class CallTree:
+    """
+    Method calls and messages, recorded as a flat log of events in call order.
+
+    Event i is a method call or message at `depths[i]`, with its call or message stored
+    once in `calls` or `messages` and referred to by `ids[i]`. Calls logged with
+    `enter_call` can keep their arguments until they're formatted. Everything logged inside a
+    method comes after it, up to `ends[i]`, so the tree can be walked without building
+    it. Index -1 is the root, which has no call.
+    """
+
     def __init__(self):
-        self.root = MethodNode(None)
-        self.current_node: MethodNode = self.root
+        self.kinds = array("b")
+        self.depths = array("I")
+        self.ids = array("I")
+        # one past the last event of each method, 0 while it's still running
+        self.ends = array("I")
+        self.calls: list[MethodCall | RawCall] = []
+        self.messages: list[str] = []
+        self._call_ids: dict[tuple, int] = {}
+        self._message_ids: dict[str, int] = {}
+        self._open: list[int] = []
+        # the door's moves that messages were logged for, as [start, stop) offsets in
+        # the order they were added, with the event of each message
+        self.move_starts = array("I")
+        self.move_stops = array("I")
+        self.move_events = array("I")
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def _append(self, kind: int, id: int, end: int):
+        self.kinds.append(kind)
+        self.depths.append(len(self._open))
+        self.ids.append(id)
+        self.ends.append(end)
 
     def enter_method(self, call: MethodCall):
-        node = MethodNode(call)
-        self.current_node.add_child(node)
-        self.current_node = node
-        return node
-
-    def add_message(self, message: str):
-        self.current_node.add_child(MessageNode(message))
+        id = self._call_ids.get(call)
+        if id is None:
+            id = self._call_ids[call] = len(self.calls)
+            self.calls.append(call)
+        self._append(METHOD, id, 0)
+        self._open.append(len(self.kinds) - 1)
+
+    def enter_call(
+        self, method_name: str, args: tuple, kwargs: dict, lazy: bool = False
+    ):
+        """
+        Like `enter_method`, but only formats the arguments when the tree is, if they
+        are all primitives like ints, strings and enums. Other arguments are formatted
+        right away, since they might change or format differently when equal, unless
+        `lazy` is set.
+        """
+        values = (*args, *kwargs.values()) if kwargs else args
+        types = tuple(map(type, values))
+        if not (_PRIMITIVE_TYPES.issuperset(types) or all(map(_is_primitive, types))):
+            if not lazy:
+                self.enter_method(MethodCall.format(method_name, args, kwargs))
+                return
+            id = len(self.calls)
+            self.calls.append(RawCall(method_name, args, kwargs))
+        else:
+            # with the types, f(1) and f(True) aren't logged as the same call
+            key = (method_name, args, tuple(kwargs.items()), types)
+            id = self._call_ids.get(key)
+            if id is None:
+                id = self._call_ids[key] = len(self.calls)
+                self.calls.append(RawCall(method_name, args, kwargs))
+        self._append(METHOD, id, 0)
+        self._open.append(len(self.kinds) - 1)
+
+    def add_message(self, message: str, moves: tuple[int, int] | None = None):
+        """Log a message, for the door's moves from `moves[0]` up to `moves[1]` if given."""
+        id = self._message_ids.get(message)
+        if id is None:
+            id = self._message_ids[message] = len(self.messages)
+            self.messages.append(message)
+        if moves is not None:
+            self.move_starts.append(moves[0])
+            self.move_stops.append(moves[1])
+            self.move_events.append(len(self.kinds))
+        self._append(MESSAGE, id, len(self.kinds) + 1)
 
     def exit_method(self):
-        if self.current_node.parent:
-            self.current_node = self.current_node.parent
+        if self._open:
+            self.ends[self._open.pop()] = len(self.kinds)
+
+    def end(self, index: int) -> int:
+        if index < 0:
+            return len(self.kinds)
+        return self.ends[index] or len(self.kinds)
+
+    def child_indices(self, index: int = -1) -> Iterator[int]:
+        """Events directly inside method `index`, skipping over their own children."""
+        i, end = index + 1, self.end(index)
+        while i < end:
+            yield i
+            i = self.end(i)
+
+    def call(self, index: int) -> MethodCall | None:
+        if index < 0:
+            return None
+        call = self.calls[self.ids[index]]
+        if isinstance(call, RawCall):
+            call = self.calls[self.ids[index]] = MethodCall.format(*call)
+        return call
+
+    def message(self, index: int) -> str:
+        return self.messages[self.ids[index]]
+
+    def message_at(self, offset: int) -> "MessageNode | None":
+        """The message logged for the move at `offset`, if there is one."""
+        i = bisect.bisect_right(self.move_starts, offset) - 1
+        if i < 0 or offset >= self.move_stops[i]:
+            return None
+        return MessageNode(self, self.move_events[i])
+
+    def node(self, index: int) -> CallNode:
+        if index >= 0 and self.kinds[index] == MESSAGE:
+            return MessageNode(self, index)
+        return MethodNode(self, index)
+
+    @property
+    def root(self) -> "MethodNode":
+        return MethodNode(self, -1)
 
     def to_string(self, options: "FormatOptions | None" = None) -> str:
+        out = io.StringIO()
+        self.write(out, options)
+        return out.getvalue()
+
+    def write(self, out: TextIO, options: "FormatOptions | None" = None):
+        """Format the tree into a text file as it is walked, without building it in memory."""
         if options is None:
             options = FormatOptions.text()
-        formatter = TextFormatter(options)
-        formatter.visit_node(self.root)
-        return "\n".join(formatter.lines)
+        TextFormatter(options, out).visit_node(self.root)
+
+
+class _NodeView:
+    """An event of a call tree, looked up in the tree when needed."""
+
+    __slots__ = ("tree", "index")
+
+    def __init__(self, tree: CallTree, index: int):
+        self.tree = tree
+        self.index = index
+
+    @property
+    def parent(self) -> "MethodNode | None":
+        if self.index < 0:
+            return None
+        depth = self.tree.depths[self.index]
+        for i in range(self.index - 1, -1, -1):
+            if self.tree.depths[i] < depth:
+                return MethodNode(self.tree, i)
+        return self.tree.root
+
+    def call_path(self) -> list[MethodCall]:
+        """Calls of the methods this event is in, outermost first."""
+        path = []
+        node = self.parent
+        while node is not None and node.index >= 0:
+            path.append(node.call_name)
+            node = node.parent
+        return path[::-1]
+
+    def __eq__(self, other) -> bool:
+        return (
+            type(other) is type(self)
+            and other.tree is self.tree
+            and other.index == self.index
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self.tree), self.index))
+
+
+class MessageNode(_NodeView):
+    __slots__ = ()
+
+    @property
+    def message(self) -> str:
+        return self.tree.message(self.index)
+
+    @property
+    def moves(self) -> tuple[int, int] | None:
+        """[start, stop) offsets of the moves this message was logged for."""
+        tree = self.tree
+        i = bisect.bisect_left(tree.move_events, self.index)
+        if i == len(tree.move_events) or tree.move_events[i] != self.index:
+            return None
+        return tree.move_starts[i], tree.move_stops[i]
+
+
+class MethodNode(_NodeView):
+    __slots__ = ()
+
+    @property
+    def call_name(self) -> MethodCall | None:
+        return self.tree.call(self.index)
+
+    @property
+    def children(self) -> list[CallNode]:
+        return [self.tree.node(i) for i in self.tree.child_indices(self.index)]
+
+
+class NullCallTree(CallTree):
+    """Call tree of an untraced door, which records nothing."""
+
+    def enter_method(self, call: MethodCall):
+        pass
+
+    def enter_call(
+        self, method_name: str, args: tuple, kwargs: dict, lazy: bool = False
+    ):
+        pass
+
+    def add_message(self, message: str, moves: tuple[int, int] | None = None):
+        pass
+
+    def exit_method(self):
+        pass
 
 
 def skip_logging[T: Callable](func: T) -> T:
@@ -67,21 +291,29 @@ def skip_logging[T: Callable](func: T) -> T:
     return func
 
 
+def lazy_args[T: Callable](func: T) -> T:
+    """
+    Only format a method's arguments once the call tree is, even ones that aren't
+    primitives. Use it for arguments that are costly to format and don't change after
+    the call.
+    """
+    func._lazy_args = True  # type: ignore
+    return func
+
+
 def log_calls(call_tree_attr: str = "call_tree"):
     """Decorator to log method calls"""
 
     def decorator[T: Callable](fn: T) -> T:
         if getattr(fn, "_skip_logging", False):
             return fn
+        method_name = fn.__name__
+        lazy = getattr(fn, "_lazy_args", False)
 
         @functools.wraps(fn)
         def wrapper(self, *args, **kwargs):
-            args_list = [str(arg) for arg in args] + [
-                f"{k}={v}" for k, v in kwargs.items()
-            ]
             call_tree: CallTree = getattr(self, call_tree_attr)
-            method_name = fn.__name__
-            call_tree.enter_method(MethodCall(method_name, args_list))
+            call_tree.enter_call(method_name, args, kwargs, lazy)
 
             try:
                 result = fn(self, *args, **kwargs)
@@ -96,14 +328,70 @@ def log_calls(call_tree_attr: str = "call_tree"):
 
 
 class AutoLog(type):
+    """
+    Logs calls to every public method of a class to its instance's call tree.
+
+    The class itself keeps its plain methods. The logging wrappers go on a subclass
+    that is only instantiated while tracing, so untraced instances run at plain method
+    speed. Tracing is on unless the DOORS_TRACE environment variable is 0, and can be
+    set per instance by passing `trace` to the class. The `tracing` class attribute
+    tells which kind of instance `self` is.
+    """
+
     def __new__(
         cls, name: str, bases: tuple[type, ...], attrs: dict[str, object]
     ) -> type:
-        for name, value in attrs.items():
-            if not name.startswith("_") and callable(value):
-                attrs[name] = log_calls()(value)
+        attrs["_logged_methods"] = {
+            name: value
+            for name, value in attrs.items()
+            if not name.startswith("_") and callable(value)
+        }
+        attrs.setdefault("tracing", False)
         return super().__new__(cls, name, bases, attrs)
 
+    # returning "maybe Any" stops type checkers from looking for `trace` in __init__,
+    # while instances keep their class's type
+    def __call__[T](
+        cls: type[T], *args, trace: bool | None = None, **kwargs
+    ) -> T | Any:
+        logged_cls = cast(AutoLog, cls)
+        if trace is None:
+            trace = tracing_enabled()
+        instance_cls = logged_cls.traced_class() if trace else logged_cls.plain_class()
+        return super(AutoLog, instance_cls).__call__(*args, **kwargs)
+
+    def plain_class(cls) -> "AutoLog":
+        return cls.__dict__.get("_plain_class", cls)
+
+    def traced_class(cls) -> "AutoLog":
+        """Subclass of `cls` with every public method of its bases wrapped in `log_calls`."""
+        cls = cls.plain_class()
+        if "_traced_class" not in cls.__dict__:
+            wrapped = {}
+            for base in reversed(cls.__mro__):
+                logged = base.__dict__.get("_logged_methods", {})
+                for name, value in base.__dict__.items():
+                    if name in logged:
+                        wrapped[name] = log_calls()(value)
+                    else:
+                        # overridden by something that isn't logged
+                        wrapped.pop(name, None)
+            traced = type.__new__(
+                type(cls),
+                cls.__name__,
+                (cls,),
+                {
+                    **wrapped,
+                    "__module__": cls.__module__,
+                    "__qualname__": cls.__qualname__,
+                    "_logged_methods": {},
+                    "_plain_class": cls,
+                    "tracing": True,
+                },
+            )
+            cls._traced_class = traced
+        return cls._traced_class
+
 
 @dataclasses.dataclass
 class FormatOptions:
@@ -133,53 +421,86 @@ class FormatOptions:
 
 
 class TextFormatter:
+    """
+    Writes a call tree to `out` line by line.
+
+    The tree is walked with a stack of the methods being formatted rather than by
+    recursion, so deep call trees fit in memory and under the recursion limit. Lines
+    are separated rather than terminated by newlines, so collapsed methods and messages
+    can still be appended to the last line written.
+    """
 
-    def __init__(self, options: FormatOptions):
+    def __init__(self, options: FormatOptions, out: TextIO):
         self.options = options
-        self.lines: list[str] = []
+        self.out = out
+        self._has_lines = False
 
-    def _add_method_message(self, method: MethodNode, depth: int, do_append: bool):
-        call_name = method.call_name
+    def _add_method_message(
+        self, call_name: MethodCall | None, depth: int, do_append: bool
+    ):
         if call_name is None:
             return
-        if do_append and self.lines:
-            self.lines[-1] += self.options.method_formatter(call_name)
+        content = self.options.method_formatter(call_name)
+        if do_append and self._has_lines:
+            if content is not None:
+                self.out.write(content)
         else:
-            self._add_line(self.options.method_formatter(call_name), depth)
+            self._add_line(content, depth)
 
-    def _add_message(self, node: MessageNode, depth: int, do_append: bool):
-        if do_append and self.lines:
-            self.lines[-1] += " " + node.message
+    def _add_message(self, message: str, depth: int, do_append: bool):
+        if do_append and self._has_lines:
+            self.out.write(" " + message)
         else:
-            self._add_line(self.options.message_formatter(node.message), depth)
+            self._add_line(self.options.message_formatter(message), depth)
 
     def _add_line(self, content: str | None, depth: int):
         if content is None:
             return
         line = self.options.get_indent(depth - 1) + content
-        self.lines.append(self.options.line_formatter(line))
+        if self._has_lines:
+            self.out.write("\n")
+        self.out.write(self.options.line_formatter(line))
+        self._has_lines = True
+
+    def _enter(
+        self, tree: CallTree, index: int, depth: int, do_append: bool
+    ) -> tuple[Iterator[int], int, bool] | None:
+        """
+        Format the call of method `index`, returning what's needed to format its
+        children, or None if the method is skipped.
+        """
+        num_children = 0
+        only_messages = True
+        message_length = 0
+        for child in tree.child_indices(index):
+            num_children += 1
+            if tree.kinds[child] == MESSAGE:
+                message_length += len(tree.message(child))
+            else:
+                only_messages = False
+
+        if self.options.skip_empty_methods and not num_children:
+            return None
+        self._add_method_message(tree.call(index), depth, do_append)
+
+        collapse = self.options.collapse_simple_methods and (
+            (num_children and only_messages and message_length < 50)
+            or num_children == 1
+        )
+        return tree.child_indices(index), depth + 1, bool(collapse)
 
     def visit_node(self, node: MethodNode, depth: int = 0, do_append: bool = False):
-        if self.options.skip_empty_methods and not node.children:
-            return
-        self._add_method_message(node, depth, do_append)
-
-        new_depth = depth + 1
-        do_append = False
-        if (
-            self.options.collapse_simple_methods
-            and node.children
-            and all(isinstance(child, MessageNode) for child in node.children)
-            and sum(len(child.message) for child in node.children) < 50
-        ):
-            do_append = True
-
-        if self.options.collapse_simple_methods and len(node.children) == 1:
-            # new_depth = depth
-            do_append = True
-
-        for child in node.children:
-            if isinstance(child, MethodNode):
-                self.visit_node(child, new_depth, do_append)
-            elif isinstance(child, MessageNode):
-                self._add_message(child, new_depth, do_append)
+        tree = node.tree
+        frame = self._enter(tree, node.index, depth, do_append)
+        stack = [frame] if frame else []
+        while stack:
+            children, depth, do_append = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+            elif tree.kinds[child] == METHOD:
+                frame = self._enter(tree, child, depth, do_append)
+                if frame:
+                    stack.append(frame)
+            else:
+                self._add_message(tree.message(child), depth, do_append)
@@ -1,9 +1,12 @@
 import unittest
+import unittest.mock
 import io
+import os
 import sys
-from doors.call_tree import log_calls
+from doors.call_tree import lazy_args, log_calls
 from doors.call_tree import FormatOptions
-from doors.call_tree import CallTree
+from doors.call_tree import AutoLog, CallTree, MethodCall, NullCallTree, TRACE_ENV
+from doors.call_tree import MessageNode, MethodNode
 
 
 class DebuggedClass:
@@ -135,5 +138,259 @@ simple_method(5):
         self.assertEqual(output.strip(), expected_output)
 
 
+class AutoLogged(metaclass=AutoLog):
+    tracing: bool
+
+    def __init__(self):
+        self.call_tree = CallTree() if self.tracing else NullCallTree()
+
+    def outer(self, value: int):
+        self.call_tree.add_message("outer")
+        return self.inner(value) + 1
+
+    def inner(self, value: int):
+        return value * 2
+
+
+class OverridingAutoLogged(AutoLogged):
+    def inner(self, value: int):
+        return value * 3
+
+
+class TestTracing(unittest.TestCase):
+    def test_traced_instances_log_calls(self):
+        obj = AutoLogged(trace=True)
+        self.assertEqual(obj.outer(2), 5)
+        self.assertEqual(obj.call_tree.to_string(), "outer(2)\n⏐ outer\n⏐ inner(2)")
+
+    def test_untraced_instances_use_plain_methods(self):
+        obj = AutoLogged(trace=False)
+        self.assertIs(type(obj), AutoLogged)
+        self.assertEqual(obj.outer(2), 5)
+        self.assertIsInstance(obj.call_tree, NullCallTree)
+        self.assertEqual(obj.call_tree.to_string(), "")
+
+    def test_subclasses_keep_overrides(self):
+        obj = OverridingAutoLogged(trace=True)
+        self.assertIsInstance(obj, OverridingAutoLogged)
+        self.assertEqual(obj.outer(2), 7)
+        self.assertIn("inner(2)", obj.call_tree.to_string())
+
+    def test_env_var_disables_tracing(self):
+        with unittest.mock.patch.dict(os.environ, {TRACE_ENV: "0"}):
+            self.assertFalse(AutoLogged().tracing)
+        with unittest.mock.patch.dict(os.environ, {TRACE_ENV: "1"}):
+            self.assertTrue(AutoLogged().tracing)
+
+    def test_null_call_tree_takes_the_same_arguments(self):
+        tree = NullCallTree()
+        tree.enter_call("f", (1,), {"flag": True}, lazy=True)
+        tree.add_message("a", (0, 1))
+        tree.exit_method()
+        self.assertEqual(len(tree), 0)
+
+    def test_door_moves_dont_depend_on_tracing(self):
+        from doors.hip.hip6 import HipSeq6
+
+        traced, untraced = HipSeq6(trace=True), HipSeq6(trace=False)
+        traced.the_whole_shebang()
+        untraced.the_whole_shebang()
+        self.assertEqual(traced.moves, untraced.moves)
+
+
+class TestCallTreeLog(unittest.TestCase):
+    def test_events_are_flat_and_interned(self):
+        obj = DebuggedClass()
+        obj.nested_calls()
+        obj.nested_calls()
+        tree = obj.call_tree
+
+        self.assertEqual(len(tree), 8)
+        self.assertEqual(list(tree.depths), [0, 1, 1, 2] * 2)
+        self.assertEqual(list(tree.ends), [4, 2, 4, 4, 8, 6, 8, 8])
+        self.assertEqual(len(tree.calls), 3)
+        self.assertEqual(tree.messages, ["Inside method_with_logging"])
+
+    def test_node_views(self):
+        obj = DebuggedClass()
+        obj.nested_calls()
+        (nested,) = obj.call_tree.root.children
+        assert isinstance(nested, MethodNode)
+        simple, logging = nested.children
+        assert isinstance(simple, MethodNode) and isinstance(logging, MethodNode)
+        (message,) = logging.children
+        assert isinstance(message, MessageNode)
+
+        self.assertEqual(str(nested.call_name), "nested_calls()")
+        self.assertEqual(simple.call_name, ("simple_method", ("5",)))
+        self.assertEqual(message.message, "Inside method_with_logging")
+        self.assertEqual(message.parent, logging)
+        self.assertEqual(nested.parent, obj.call_tree.root)
+        self.assertIsNone(obj.call_tree.root.parent)
+
+    def test_unfinished_methods_contain_the_rest(self):
+        tree = CallTree()
+        tree.enter_method(MethodCall("outer", ()))
+        tree.add_message("a")
+        tree.add_message("b")
+        self.assertEqual(tree.to_string(), "outer() a b")
+
+
+class TestStreamingFormatter(unittest.TestCase):
+    def test_deep_trees_dont_recurse(self):
+        tree = CallTree()
+        depth = sys.getrecursionlimit() * 2
+        for i in range(depth):
+            tree.enter_method(MethodCall("pull", (str(i),)))
+            tree.add_message("x")
+        for _ in range(depth):
+            tree.exit_method()
+
+        lines = tree.to_string(FormatOptions.yaml()).split("\n")
+        # the innermost method only logs a message, so it's collapsed onto one line
+        self.assertEqual(len(lines), 2 * depth - 1)
+        self.assertEqual(lines[-1], "  " * (depth - 1) + f"- pull({depth - 1}): x")
+
+    def test_write_gzipped_call_tree(self):
+        import gzip
+        import tempfile
+        from doors.hip.basic_hip import write_call_tree
+
+        obj = DebuggedClass()
+        obj.complex_method()
+        options = FormatOptions.yaml()
+        options.skip_empty_methods = True
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_call_tree(obj.call_tree, os.path.join(tmp, "tree"), True)
+            assert path is not None
+            self.assertEqual(path, os.path.join(tmp, "tree.yaml.gz"))
+            with gzip.open(path, "rt") as f:
+                self.assertEqual(f.read(), obj.call_tree.to_string(options))
+
+
+class Counter:
+    def __init__(self):
+        self.count = 0
+
+    def __str__(self):
+        return str(self.count)
+
+
+class LazyArgs:
+    def __init__(self):
+        self.call_tree = CallTree()
+
+    @log_calls()
+    def lazy(self, value, flag=False):
+        if isinstance(value, Counter):
+            value.count += 1
+        elif isinstance(value, list):
+            value.append(1)
+
+    @log_calls()
+    @lazy_args
+    def lazier(self, value: Counter):
+        value.count += 1
+
+
+class TestLazyArgs(unittest.TestCase):
+    def test_args_are_formatted_with_the_tree(self):
+        obj = LazyArgs()
+        obj.lazy(1)
+        obj.lazy(True)
+        obj.lazy(1, flag=True)
+        obj.lazy(1)
+        self.assertEqual(
+            obj.call_tree.to_string(),
+            "lazy(1)\nlazy(True)\nlazy(1, flag=True)\nlazy(1)",
+        )
+        self.assertEqual(len(obj.call_tree.calls), 3)
+
+    def test_other_args_are_formatted_right_away(self):
+        obj = LazyArgs()
+        obj.lazy([])
+        counter = Counter()
+        obj.lazy(counter)
+        obj.lazy(counter)
+        self.assertEqual(obj.call_tree.to_string(), "lazy([])\nlazy(0)\nlazy(1)")
+
+    def test_equal_args_that_format_differently(self):
+        obj = LazyArgs()
+        obj.lazy((1,))
+        obj.lazy((True,))
+        self.assertEqual(obj.call_tree.to_string(), "lazy((1,))\nlazy((True,))")
+
+    def test_lazy_args(self):
+        obj = LazyArgs()
+        counter = Counter()
+        obj.lazier(counter)
+        obj.lazy(counter)
+        obj.lazier(counter)
+        self.assertEqual(obj.call_tree.to_string(), "lazier(3)\nlazy(1)\nlazier(3)")
+        # calls with non-primitive arguments aren't interned
+        self.assertEqual(len(obj.call_tree.calls), 3)
+
+
+class TestWriteSequence(unittest.TestCase):
+    def test_bare_file_names(self):
+        import tempfile
+        from doors.hip.basic_hip import write_sequence
+        from gen.params import read_sequence
+
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                with open("key.txt", "w") as f:
+                    f.write("1 wait\n5 a\n12 b\n")
+                write_sequence(["a", "b", "a"], "sequence.txt")
+                text = list(read_sequence(".").ss)
+                os.remove("sequence.txt")
+                write_sequence(["a", "b", "a"], "sequence.seqbin")
+                self.assertEqual(list(read_sequence(".").ss), text)
+            finally:
+                os.chdir(cwd)
+
+
+class TestWhere(unittest.TestCase):
+    def test_messages_record_their_moves(self):
+        from doors.hip.hip6 import HipSeq6
+
+        door = HipSeq6(trace=True)
+        door.the_whole_shebang()
+        node = door.call_tree.message_at(20)
+        assert node is not None and node.moves is not None
+        start, stop = node.moves
+        self.assertLessEqual(start, 20)
+        self.assertLess(20, stop)
+        self.assertEqual(node.message.split(), list(map(str, door.moves[start:stop])))
+        self.assertEqual(str(node.call_path()[0]), "the_whole_shebang()")
+        self.assertIsNone(door.call_tree.message_at(len(door.moves) + 10))
+
+    def test_lookup(self):
+        import json
+        from doors.where import lookup, offset_index
+
+        obj = DebuggedClass()
+        obj.call_tree.add_message("first", (0, 2))
+        obj.nested_calls()
+        obj.call_tree.enter_method(MethodCall("outer", ("1",)))
+        obj.method_with_logging()
+        obj.call_tree.add_message("second", (2, 5))
+        obj.call_tree.exit_method()
+        # indexes are saved as json
+        index = json.loads(json.dumps(offset_index(obj.call_tree, 8)))
+
+        self.assertEqual(lookup(index, 1), ([], "first", (0, 2)))
+        self.assertEqual(lookup(index, 4), (["outer(1)"], "second", (2, 5)))
+        # unlogged moves are found as the message before them
+        location = lookup(index, 7)
+        assert location is not None
+        self.assertEqual(location.message, "second")
+        # moves past the end of the final sequence were removed after being logged
+        self.assertIsNone(lookup(index, 8))
+        self.assertEqual(offset_index(obj.call_tree)["moves"], 5)
+
+
 if __name__ == "__main__":
     unittest.main()
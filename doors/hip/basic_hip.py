@@ -1,45 +1,94 @@
+import gzip
 import os
 from doors.call_tree import FormatOptions, AutoLog
-from doors.call_tree import CallTree
+from doors.call_tree import CallTree, NullCallTree
+from doors.where import index_path, write_offset_index
+
+
+def make_parent_dirs(path: str):
+    # a bare file name is in the working directory, which already exists
+    dirname = os.path.dirname(path)
+    if dirname:
+        os.makedirs(dirname, exist_ok=True)
 
 
 def write_file(path: str, content: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    make_parent_dirs(path)
 
     with open(path, "w") as f:
         f.write(content)
 
 
-def write_call_tree(call_tree: CallTree, path: str):
+def write_call_tree(
+    call_tree: CallTree,
+    path: str,
+    gzipped: bool = False,
+    num_moves: int | None = None,
+):
+    """
+    Write a call tree as yaml to `path`, or gzipped to `path`.gz, streaming it to the
+    file as it's formatted, and its index of move offsets next to it for
+    `python -m doors.where`. `num_moves` is the length of the door's sequence. Returns
+    the path written to.
+    """
+    # an untraced run keeps the call tree of the last traced one
+    if isinstance(call_tree, NullCallTree):
+        return None
     if not path.endswith(".yaml"):
         path += ".yaml"
+    if gzipped:
+        path += ".gz"
     options = FormatOptions.yaml()
     options.skip_empty_methods = True
-    content = call_tree.to_string(options)
-    write_file(path, content)
-    return content
+    make_parent_dirs(path)
+    with gzip.open(path, "wt") if gzipped else open(path, "w") as f:
+        call_tree.write(f, options)
+    write_offset_index(call_tree, index_path(path), num_moves)
+    return path
 
 
 def write_sequence[T](moves: list[T], path: str):
-    write_file(path, "\n".join(map(str, moves)))
+    """
+    Write moves one per line, or as a binary .seqbin if `path` ends with that.
+
+    A .seqbin is encoded with the key.txt next to it.
+    """
+    if not path.endswith(".seqbin"):
+        write_file(path, "\n".join(map(str, moves)))
+        return
+
+    from gen.params import parse_encoding
+    from gen.seqbin import write_seqbin
+
+    make_parent_dirs(path)
+    with open(os.path.join(os.path.dirname(path), "key.txt"), "r") as f:
+        key = parse_encoding(f.read())
+    write_seqbin(path, moves, key)
 
 
 class BasicDoor[Move](metaclass=AutoLog):
+    # set by AutoLog, True on instances that log their calls
+    tracing: bool
+
     def __init__(self):
         self.moves: list[Move] = []
-        self.call_tree = CallTree()
+        self.call_tree = CallTree() if self.tracing else NullCallTree()
 
     def _add(self, *moves: Move):
+        start = len(self.moves)
         self.moves.extend(moves)
-        self.call_tree.add_message(" ".join(map(str, moves)))
+        if self.tracing:
+            self.call_tree.add_message(
+                " ".join(map(str, moves)), (start, len(self.moves))
+            )
 
     def __iadd__(self, moves: list[Move] | Move):
         moves = moves if isinstance(moves, list) else [moves]
         self._add(*moves)
         return self
 
-    def _write_call_tree(self, path: str):
-        write_call_tree(self.call_tree, path)
+    def _write_call_tree(self, path: str, gzipped: bool = False):
+        write_call_tree(self.call_tree, path, gzipped, len(self.moves))
 
     def _write_sequence(self, path: str):
         write_sequence(self.moves, path)
@@ -412,8 +412,7 @@ class HipSeq10(BasicHip[Move]):
         self.stack_state = [False, False, True, True, True, False]
 
     def _add(self, *moves: Move):
-        self.call_tree.add_message(" ".join(map(str, moves)))
-
+        start = len(self.moves)
         for move in moves:
             last_move = self.moves[-1] if self.moves else None
 
@@ -434,6 +433,11 @@ class HipSeq10(BasicHip[Move]):
             if move == a:
                 self.a_toggle = not self.a_toggle
 
+        if self.tracing:
+            self.call_tree.add_message(
+                " ".join(map(str, moves)), (start, len(self.moves))
+            )
+
 
 def main():
     door = HipSeq10()
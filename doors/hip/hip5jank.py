@@ -2,7 +2,7 @@ from enum import Enum
 from collections import Counter
 from typing import Iterable
 
-from doors.call_tree import AutoLog, CallTree, skip_logging
+from doors.call_tree import AutoLog, CallTree, NullCallTree, skip_logging
 from doors.hip.basic_hip import write_call_tree, write_sequence
 from typing import Callable
 
@@ -68,9 +68,12 @@ def e_full(door: "Hip5JankSeq"):
 
 
 class Hip5JankSeq(metaclass=AutoLog):
+    # set by AutoLog, True on instances that log their calls
+    tracing: bool
+
     def __init__(self):
         self.moves: list[Move] = []
-        self.call_tree = CallTree()
+        self.call_tree = CallTree() if self.tracing else NullCallTree()
         self.e_empty = False
         self.worm_state = WormState.Down
 
@@ -98,11 +101,14 @@ class Hip5JankSeq(metaclass=AutoLog):
 
     def _add(self, *elements: Move | Macro):
         row_message = []
+        start = len(self.moves)
 
         def pop_wait():
+            nonlocal start
             if self.moves and self.moves[-1] == Move.WAIT:
                 self.moves.pop()
                 row_message.append("~~")
+                start = min(start, len(self.moves))
 
         def flatten_moves(elements: Iterable[Macro]) -> Iterable[Move]:
             for element in elements:
@@ -126,7 +132,10 @@ class Hip5JankSeq(metaclass=AutoLog):
             self.moves.append(move)
             row_message.append(move)
 
-        self.call_tree.add_message(" ".join(map(str, row_message)))
+        if self.tracing:
+            self.call_tree.add_message(
+                " ".join(map(str, row_message)), (start, len(self.moves))
+            )
 
     def __iadd__(self, other: list[Macro] | Macro):
         moves = other if isinstance(other, list) else [other]
@@ -253,7 +262,11 @@ def main(method="everything", out_file="sequence.txt"):
     finally:
         print(len(door.moves))
         write_sequence(door.moves, f"door_meta/5x5hip_jank/{out_file}")
-        write_call_tree(door.call_tree, f"door_meta/5x5hip_jank/call_tree_{method}")
+        write_call_tree(
+            door.call_tree,
+            f"door_meta/5x5hip_jank/call_tree_{method}",
+            num_moves=len(door.moves),
+        )
 
         move_counts = Counter(door.moves)
         print("Move Counts:")
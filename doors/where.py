@@ -0,0 +1,176 @@
+"""
+Find the generator call that emitted a move of a door's sequence.
+
+Writing a call tree also writes an index of the moves each message was logged for, as
+sorted offsets into the sequence. Each message points to the innermost method around
+it, and methods to the one around them, so looking up an offset is a binary search
+followed by walking up the calls:
+
+    python -m doors.where 10x10hipnew 3120
+
+Offsets start at 0, so they're the line number in sequence.txt minus one. Moves a
+generator changes in `moves` directly instead of adding them with `+=` aren't logged, so
+they're found as the message logged just before them.
+"""
+
+import bisect
+import glob
+import json
+import os
+from os import path
+from typing import NamedTuple
+
+from doors.call_tree import METHOD, CallTree
+
+INDEX_SUFFIX = ".index.json"
+
+
+class Location(NamedTuple):
+    # calls of the methods around the message, outermost first
+    calls: list[str]
+    message: str
+    # [start, stop) offsets of the message's moves
+    moves: tuple[int, int]
+
+
+def index_path(call_tree_path: str) -> str:
+    """call_tree.yaml and call_tree.yaml.gz have their index in call_tree.index.json."""
+    base = call_tree_path.removesuffix(".gz").removesuffix(".yaml")
+    return base + INDEX_SUFFIX
+
+
+def offset_index(call_tree: CallTree, num_moves: int | None = None) -> dict:
+    """
+    The index of a call tree's move offsets, as a JSON object. `num_moves` is the
+    length of the door's final sequence, by default the end of the last logged move.
+    """
+    calls: list[str] = []
+    call_ids: dict[str, int] = {}
+    # [call, parent] of each method around a message, -1 is the root
+    nodes: list[list[int]] = []
+    node_ids: dict[int, int] = {}
+    index = {"starts": [], "stops": [], "paths": [], "messages": []}
+
+    # events of the methods around the current event
+    open_methods: list[int] = []
+    next_message = 0
+    for event, (kind, depth) in enumerate(zip(call_tree.kinds, call_tree.depths)):
+        del open_methods[depth:]
+        if kind == METHOD:
+            open_methods.append(event)
+            continue
+        if (
+            next_message == len(call_tree.move_events)
+            or call_tree.move_events[next_message] != event
+        ):
+            continue
+
+        parent = -1
+        for method in open_methods:
+            if method not in node_ids:
+                call = str(call_tree.call(method))
+                if call not in call_ids:
+                    call_ids[call] = len(calls)
+                    calls.append(call)
+                node_ids[method] = len(nodes)
+                nodes.append([call_ids[call], parent])
+            parent = node_ids[method]
+
+        index["starts"].append(call_tree.move_starts[next_message])
+        index["stops"].append(call_tree.move_stops[next_message])
+        index["paths"].append(parent)
+        index["messages"].append(call_tree.ids[event])
+        next_message += 1
+
+    if num_moves is None:
+        num_moves = max(call_tree.move_stops, default=0)
+    return {
+        "moves": num_moves,
+        "calls": calls,
+        "nodes": nodes,
+        "texts": call_tree.messages,
+        **index,
+    }
+
+
+def write_offset_index(call_tree: CallTree, path: str, num_moves: int | None = None):
+    with open(path, "w") as f:
+        json.dump(offset_index(call_tree, num_moves), f, separators=(",", ":"))
+
+
+def lookup(index: dict, offset: int) -> Location | None:
+    """
+    Where the move at `offset` was emitted: the last message logged for moves starting
+    at or before it. None if there is no such message, or no such move in the final
+    sequence, since generators can remove moves after logging them.
+    """
+    if offset >= index["moves"]:
+        return None
+    i = bisect.bisect_right(index["starts"], offset) - 1
+    if i < 0:
+        return None
+
+    calls = []
+    node = index["paths"][i]
+    while node != -1:
+        call, node = index["nodes"][node]
+        calls.append(index["calls"][call])
+    return Location(
+        calls[::-1],
+        index["texts"][index["messages"][i]],
+        (index["starts"][i], index["stops"][i]),
+    )
+
+
+def find_index(info_dir: str) -> str:
+    """The most recently written index in a door's folder."""
+    paths = glob.glob(path.join(glob.escape(info_dir), "*" + INDEX_SUFFIX))
+    if not paths:
+        raise FileNotFoundError(
+            f"No call tree index in {info_dir}, run the door's generator with tracing."
+        )
+    return max(paths, key=os.path.getmtime)
+
+
+def main():
+    import click
+
+    from gen.build import resolve_info_dir
+
+    @click.command()
+    @click.argument("door")
+    @click.argument("offset", type=click.IntRange(min=0))
+    @click.option(
+        "--index",
+        "index_file",
+        type=click.Path(exists=True, dir_okay=False),
+        help="Index to search, by default the newest one in the door's folder.",
+    )
+    def where(door: str, offset: int, index_file: str | None):
+        """Show the generator calls that emitted move OFFSET of DOOR's sequence."""
+        try:
+            index_file = index_file or find_index(resolve_info_dir(door))
+        except FileNotFoundError as e:
+            raise click.ClickException(str(e))
+        with open(index_file) as f:
+            index = json.load(f)
+        if offset >= index["moves"]:
+            raise click.ClickException(
+                f"Offset {offset} is past the end of the sequence, which has "
+                f"{index['moves']} moves."
+            )
+        location = lookup(index, offset)
+        if location is None:
+            raise click.ClickException(f"No move logged at or before offset {offset}.")
+
+        start, stop = location.moves
+        click.echo(" > ".join(location.calls) or "(top level)")
+        click.echo(f"moves {start}-{stop - 1}: {location.message}")
+        if offset >= stop:
+            click.echo(f"move {offset} wasn't logged, this is the message before it")
+
+    where()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,144 @@
 import click
-from os import path
+import functools
+import os
+import sys
+import time
 
-from gen.rom_gen import gen_rom
-from gen.params import parse_params, parse_sequence
+from gen.build import (
+    DOOR_META_DIR,
+    STDOUT,
+    build_doors,
+    build_rom,
+    build_rom_incremental,
+    find_doors,
+    resolve_info_dir,
+    resolve_out_path,
+    update_generators,
+)
+from gen.compress import Compression
+from gen.shard import Sharding, index_path, parse_sharding
 
 
-def read_file(path: str) -> str:
-    with open(path, "r") as f:
-        return f.read()
+def known_doors() -> set[str]:
+    """Door names in door_meta, none if there is no door_meta here."""
+    return set(find_doors()) if os.path.isdir(DOOR_META_DIR) else set()
 
 
-@click.command()
+class DefaultGroup(click.Group):
+    """
+    Group that falls back to `default_command` when no subcommand is given, or to
+    `many_command` when it starts with several door names.
+    """
+
+    def __init__(self, *args, default_command: str, many_command: str, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+        self.many_command = many_command
+
+    def parse_args(self, ctx: click.Context, args: list[str]) -> list[str]:
+        if not args or (args[0] not in self.commands and args[0] not in ("--help",)):
+            # `6x6hip 7x7hip` would otherwise build 6x6hip into 7x7hip.schem
+            many = len(args) > 1 and set(args[:2]) <= known_doors()
+            args = [self.many_command if many else self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultGroup, default_command="build", many_command="batch")
+def main():
+    """
+    Generate ROMs from door information.
+
+    Runs `build` if no command is given, or `batch` if given several door names.
+    """
+
+
+incremental_option = click.option(
+    "-i",
+    "--incremental",
+    is_flag=True,
+    help="Rerun the sequence generator and rebuild the ROM only if their inputs changed.",
+)
+
+
+def compression_options(command):
+    """Add the schematic compression options, passed on as `compression`."""
+    options = [
+        click.option(
+            "-l",
+            "--level",
+            type=click.IntRange(1, 9),
+            default=9,
+            show_default=True,
+            help="Gzip compression level, 1 is fastest, 9 smallest.",
+        ),
+        click.option(
+            "--no-gzip",
+            is_flag=True,
+            help="Write uncompressed NBT, for piping into other tools.",
+        ),
+        click.option(
+            "-t",
+            "--threads",
+            type=click.IntRange(0),
+            default=1,
+            show_default=True,
+            help="Compress blocks of the schematic in parallel. 0 uses every CPU.",
+        ),
+    ]
+
+    def wrapper(level: int, no_gzip: bool, threads: int, **kwargs):
+        return command(compression=Compression(level, not no_gzip, threads), **kwargs)
+
+    wrapper = functools.update_wrapper(wrapper, command)
+    for option in reversed(options):
+        wrapper = option(wrapper)
+    return wrapper
+
+
+@main.command()
 @click.argument("info_dir")
 @click.argument("out_path", required=False)
-def main(info_dir: str, out_path: str | None):
+@incremental_option
+@click.option(
+    "--patch",
+    is_flag=True,
+    help="Only re-encode carts that changed since the last --patch build of OUT_PATH.",
+)
+@click.option(
+    "--profile", is_flag=True, help="Print wall clock and CPU time per build stage."
+)
+@click.option(
+    "--cprofile",
+    "cprofile_path",
+    metavar="PATH",
+    help="Dump cProfile stats to PATH. Implies --profile.",
+)
+@click.option(
+    "--shards",
+    metavar="N|carts:N|bytes:N",
+    help="Split the ROM into N schematics, or into schematics of at most N carts or N"
+    " bytes (like 512k), written next to OUT_PATH with a .shards.json index.",
+)
+@click.option(
+    "--shard-offset",
+    nargs=3,
+    type=int,
+    default=(0, 0, 0),
+    metavar="X Y Z",
+    help="Move the origin of each shard this far from the one before it.",
+)
+@compression_options
+def build(
+    info_dir: str,
+    out_path: str | None,
+    incremental: bool,
+    patch: bool,
+    profile: bool,
+    cprofile_path: str | None,
+    shards: str | None,
+    shard_offset: tuple[int, int, int],
+    compression: Compression,
+):
     """
     Generate ROM from door information.
 
@@ -21,35 +146,214 @@ def main(info_dir: str, out_path: str | None):
     INFO_DIR: Directory containing door information files
     OUT_PATH: Path to output file. Default: output_schematics/{door_name}/{door_name}.schem
     If OUT_PATH does not contain a file separator, the folder will be output_schematics/{door_name}.
+    If OUT_PATH is -, the schematic is written to stdout and messages to stderr.
     """
 
-    if path.pathsep in info_dir:
-        resolved_info_dir = info_dir
+    to_stdout = out_path == STDOUT
+    if out_path is not None and out_path in known_doors():
+        raise click.UsageError(
+            f"OUT_PATH {out_path} is a door name, use `batch` to build several doors"
+            f" or pass {out_path}.schem to write that file."
+        )
+    if to_stdout and (incremental or patch or shards):
+        raise click.UsageError("-i, --patch and --shards need an output file, not -.")
+    # keep stdout for the schematic
+    echo = functools.partial(print, file=sys.stderr if to_stdout else sys.stdout)
+
+    sharding = None
+    if shards is not None:
+        if patch:
+            raise click.UsageError("--shards and --patch can't be combined.")
+        try:
+            sharding = parse_sharding(shards, shard_offset)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--shards")
+
+    if not profile and cprofile_path is None:
+        return build_once(
+            info_dir, out_path, incremental, patch, compression, sharding, echo
+        )
+
+    from gen.timing import profiling
+
+    with profiling(cprofile_path) as profiler:
+        build_once(info_dir, out_path, incremental, patch, compression, sharding, echo)
+    echo()
+    echo(profiler.report())
+    if cprofile_path:
+        echo(f"Wrote cProfile stats to {os.path.abspath(cprofile_path)}")
+
+
+def build_once(
+    info_dir: str,
+    out_path: str | None,
+    incremental: bool,
+    patch: bool,
+    compression: Compression,
+    sharding: Sharding | None,
+    echo=print,
+):
+    resolved_info_dir = resolve_info_dir(info_dir)
+    door_name = os.path.basename(resolved_info_dir)
+    out_path = resolve_out_path(door_name, out_path)
+
+    if not incremental:
+        stats = build_rom(resolved_info_dir, out_path, patch, compression, sharding)
+    else:
+        for module in update_generators([door_name]):
+            echo(f"Ran sequence generator {module}")
+        stats = build_rom_incremental(
+            resolved_info_dir, out_path, patch, compression, sharding
+        )
+        if stats is None:
+            echo(f"Up to date: {os.path.abspath(out_path)}")
+            return
+    if "shards" in stats:
+        echo(f"Wrote {len(stats['shards'])} shards, in paste order:")
+        for shard in stats["shards"]:
+            echo(f"  {os.path.abspath(shard)}")
+        echo(f"Index: {os.path.abspath(index_path(out_path))}")
+    elif out_path == STDOUT:
+        echo("Wrote file to stdout")
     else:
-        resolved_info_dir = f"door_meta/{info_dir}"
+        echo(f"Wrote file to {os.path.abspath(out_path)}")
+    echo(f"Carts: {stats['carts']}")
+    if "estimated_read_time" in stats:
+        echo(f"Estimated read time: {stats['estimated_read_time']:g}")
+    if "changed_carts" in stats:
+        echo(f"Changed carts: {format_indices(stats['changed_carts']) or 'none'}")
+
 
-    door_name = path.basename(resolved_info_dir)
+def format_indices(indices: list[int]) -> str:
+    """Indices as comma separated ranges, like 0-3, 7, 9-10."""
+    ranges = []
+    for i in indices:
+        if ranges and ranges[-1][1] == i - 1:
+            ranges[-1][1] = i
+        else:
+            ranges.append([i, i])
+    return ", ".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
 
-    if out_path is None:
-        out_path = door_name
 
-    if path.sep not in out_path:
-        out_path = f"output_schematics/{door_name}/{out_path}"
+@main.command()
+@click.argument("doors", nargs=-1)
+@click.option("--all", "all_doors", is_flag=True, help="Build every door in door_meta.")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="Worker processes. Default: CPU count.",
+)
+@click.option("--name", help="Output file name, as OUT_PATH for `build`.")
+@incremental_option
+@compression_options
+def batch(
+    doors: tuple[str, ...],
+    all_doors: bool,
+    jobs: int | None,
+    name: str | None,
+    incremental: bool,
+    compression: Compression,
+):
+    """
+    Generate ROMs for several doors in parallel.
 
-    sequence = parse_sequence(
-        encoding_file=read_file(path.join(resolved_info_dir, "key.txt")),
-        sequence_file=read_file(path.join(resolved_info_dir, "sequence.txt")),
+    \b
+    DOORS: Door names in door_meta. Ignored with --all.
+    """
+    door_list = find_doors() if all_doors else list(doors)
+    if not door_list:
+        raise click.UsageError("No doors given, pass door names or --all.")
+    if name is not None and (os.path.sep in name or name == STDOUT):
+        raise click.UsageError("--name must be a file name, not a path.")
+
+    start = time.perf_counter()
+    results = build_doors(door_list, name, jobs, incremental, compression)
+
+    width = max(len(result.door) for result in results)
+    for result in results:
+        status = "FAILED" if result.error else "skip" if result.skipped else "ok"
+        print(
+            f"{result.door:<{width}}  {status:<6}  {result.seconds:6.2f}s  {result.out_path}"
+        )
+    for result in results:
+        if result.error:
+            print(f"\n{result.door} failed:\n{result.error}", file=sys.stderr)
+
+    failed = sum(result.error is not None for result in results)
+    print(
+        f"Built {len(results) - failed}/{len(results)} doors"
+        f" in {time.perf_counter() - start:.2f}s"
     )
-    params = parse_params(read_file(path.join(resolved_info_dir, "params.json")))
-    schem = gen_rom(sequence, params)
+    if failed:
+        sys.exit(1)
+
+
+@main.command()
+@click.argument("door")
+@click.argument("out_path", required=False)
+@click.option(
+    "--interval",
+    type=click.FloatRange(min=0),
+    default=0.2,
+    show_default=True,
+    help="Seconds between checks for changed files.",
+)
+@compression_options
+def watch(door: str, out_path: str | None, interval: float, compression: Compression):
+    """
+    Rebuild a door's ROM whenever its sequence generator or door_meta files change.
+
+    \b
+    DOOR: Door name in door_meta
+    OUT_PATH: As for `build`
+    """
+    from doors import DOOR_GENERATORS
+    from gen.watch import Watcher
+
+    info_dir = resolve_info_dir(door)
+    door_name = os.path.basename(info_dir)
+    if out_path == STDOUT:
+        raise click.UsageError("watch needs an output file, not -.")
+    out_path = resolve_out_path(door_name, out_path)
+    module = DOOR_GENERATORS.get(door_name)
+    Watcher(door_name, info_dir, out_path, module, compression).run(interval)
+
+
+@main.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", default=8765, show_default=True)
+@click.option("--unix", "unix_path", help="Listen on this unix socket instead of TCP.")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    help="Worker processes. Default: CPU count.",
+)
+@click.option(
+    "--cache",
+    "cache_size",
+    type=click.IntRange(0),
+    default=32,
+    show_default=True,
+    help="Number of recent results to keep.",
+)
+def serve(
+    host: str, port: int, unix_path: str | None, jobs: int | None, cache_size: int
+):
+    """
+    Serve ROM builds to local tools over a socket.
+
+    See gen/serve.py for the protocol.
+    """
+    import asyncio
 
-    if not out_path.endswith(".schem"):
-        out_path += ".schem"
-    import os
+    from gen.serve import serve as run_server
 
-    os.makedirs(path.dirname(out_path), exist_ok=True)
-    schem.save(out_path)
-    print("Wrote file to", os.path.abspath(out_path))
+    try:
+        asyncio.run(run_server(host, port, unix_path, jobs, cache_size))
+    except KeyboardInterrupt:
+        pass
 
 
 if __name__ == "__main__":
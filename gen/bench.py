@@ -0,0 +1,409 @@
+"""
+Benchmarks for ROM generation.
+
+`python -m gen.bench run` times every stage of a build, from parsing to writing the
+schematic, on synthetic sequences and the doors in door_meta, and writes the results as
+JSON. `python -m gen.bench compare OLD NEW` flags regressions between two result files.
+`python -m gen.bench encode [door ...]` and `python -m gen.bench imports` time fragment
+encoding and module imports.
+"""
+
+import io
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Iterator
+
+import click
+import numpy as np
+
+from gen.build import find_doors
+from gen.cart_split_dp import cart_split_dp
+from gen.encode import (
+    cart1_bytes,
+    disc_shulker_bytes,
+    encode_rom1,
+    encode_rom1_bytes,
+    encode_rom27,
+    encode_rom27_bytes,
+    encode_rom729,
+    encode_rom729_bytes,
+    item_bytes,
+)
+from gen.nbt_stream import write_schem
+from gen.params import Rom26, Rom27, Rom729, Sequence, parse_sequence, read_door
+from gen.rom_gen import (
+    carts_schem,
+    gen_rom,
+    partition_rom26,
+    partition_rom27,
+    partition_rom27_dp,
+    partition_rom27_optimized,
+    partition_rom729,
+    rom_carts,
+    save_rom,
+)
+from gen.seqbin import pack_sequence
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def clear_fragment_caches():
+    for cached in (cart1_bytes, item_bytes, disc_shulker_bytes):
+        cached.cache_clear()
+
+
+def bench_encode(door: str, repeat: int):
+    """Time encoding and serializing a door's ROM, with and without fragment caching."""
+    sequence, params = read_door(f"door_meta/{door}")
+
+    def write(serialized: bool):
+        rom = rom_carts(sequence, params, serialized)
+        write_schem(io.BytesIO(), rom.carts, rom.num_carts, rom.origin)
+
+    objects = best_of(lambda: write(False), repeat)
+    clear_fragment_caches()
+    cold = best_of(lambda: write(True), 1)
+    warm = best_of(lambda: write(True), repeat)
+
+    print(f"{door} ({params.rom_type}, {len(sequence)} moves)")
+    print(f"  nbtlib compounds:  {objects * 1000:8.1f} ms")
+    print(f"  fragments (cold):  {cold * 1000:8.1f} ms")
+    print(f"  fragments (warm):  {warm * 1000:8.1f} ms  ({objects / warm:.0f}x)")
+
+
+SIZES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1M": 1_000_000}
+# nbtlib compounds for every cart get slow and large, so those stop at 100k moves
+MAX_OBJECT_MOVES = 100_000
+CART_POS = [0.5, 0, 0.5]
+WAIT = 1
+KEY = {"wait": WAIT} | {f"move{ss}": ss for ss in range(2, 16)}
+
+type Bench = tuple[str, Callable[[], object]]
+
+
+def synthetic_sequence(num_moves: int, seed: int = 0) -> Sequence:
+    """
+    Random signal strengths 1 to 15, a third of them wait moves. It ends in a few
+    non-waits, so cut wait partitions always have a long enough last cart.
+    """
+    rng = np.random.default_rng(seed)
+    ss = rng.integers(2, 16, num_moves, dtype=np.uint8)
+    ss[rng.random(num_moves) < 1 / 3] = WAIT
+    ss[-4:] = 2
+    return Sequence(ss, WAIT)
+
+
+def sequence_benches(sequence: Sequence, tmp_dir: str) -> Iterator[Bench]:
+    """Every stage of a build, on one sequence. Setup work happens outside the timed calls."""
+    key_text = "\n".join(f"{ss} {name}" for name, ss in KEY.items())
+    names = {ss: name for name, ss in KEY.items()}
+    text = "\n".join(names[ss] for ss in sequence.ss_list)
+    seqbin = pack_sequence(sequence.ss, KEY)
+    yield "parse_sequence/text", lambda: parse_sequence(key_text, text)
+    yield "parse_sequence/seqbin", lambda: parse_sequence(key_text, seqbin)
+
+    ss_list = sequence.ss_list
+    rom27 = Rom27(rom_type="cart27", medium="disc")
+    rom27_dp = Rom27(rom_type="cart27", medium="disc", partition="dp", dp_b=10)
+    rom729 = Rom729(rom_type="cart729")
+    padded26 = sequence.padded(-(-len(sequence) // 26) * 26)
+    is_wait = sequence.wait_mask.tolist()
+    yield "partition_rom27", lambda: partition_rom27(ss_list, rom27)
+    yield "partition_rom27_optimized", lambda: partition_rom27_optimized(ss_list, WAIT)
+    yield "partition_rom27_dp", lambda: partition_rom27_dp(sequence, rom27_dp)
+    yield "partition_rom26", lambda: partition_rom26(padded26)
+    yield "partition_rom729", lambda: partition_rom729(sequence, rom729)
+    yield "cart_split_dp", lambda: cart_split_dp(is_wait, 1, 27, 0, 10)
+
+    carts27 = partition_rom27(ss_list, rom27)
+    carts729 = partition_rom729(sequence, rom729)
+    yield "encode_rom1_bytes", lambda: list(encode_rom1_bytes(ss_list, CART_POS, True))
+    yield "encode_rom27_bytes", lambda: list(
+        encode_rom27_bytes(carts27, CART_POS, "disc")
+    )
+    yield "encode_rom729_bytes", lambda: list(encode_rom729_bytes(carts729, CART_POS))
+    out_path = os.path.join(tmp_dir, "rom.schem")
+    yield "save_rom", lambda: save_rom(sequence, rom27, out_path)
+
+    if len(sequence) > MAX_OBJECT_MOVES:
+        return
+    yield "encode_rom1", lambda: list(encode_rom1(ss_list, CART_POS, True))
+    yield "encode_rom27", lambda: list(encode_rom27(carts27, CART_POS, "disc"))
+    yield "encode_rom729", lambda: list(encode_rom729(carts729, CART_POS))
+    minecarts = list(encode_rom27(carts27, CART_POS, "disc"))
+    yield "carts_schem", lambda: carts_schem(minecarts)
+    schem = carts_schem(minecarts)
+    yield "File.save", lambda: schem.save(out_path)
+
+
+def door_benches(door: str, tmp_dir: str) -> Iterator[Bench]:
+    """Building a real door's ROM, with its own params."""
+    info_dir = f"door_meta/{door}"
+    sequence, params = read_door(info_dir)
+    out_path = os.path.join(tmp_dir, "rom.schem")
+    yield "read_door", lambda: read_door(info_dir)
+    yield "save_rom", lambda: save_rom(sequence, params, out_path)
+    yield "gen_rom+File.save", lambda: gen_rom(sequence, params).save(out_path)
+
+
+def measure(fn: Callable[[], object], repeat: int) -> dict[str, float]:
+    """Best time of `repeat` runs, and peak traced memory of one more run."""
+    seconds = best_of(fn, repeat)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": seconds, "peak_bytes": peak}
+
+
+def run_suite(
+    sizes: list[str],
+    doors: list[str],
+    repeat: int = 3,
+    only: str | None = None,
+    log: Callable[[str], None] = lambda line: None,
+) -> dict:
+    """Run the benchmarks, returning results keyed by "bench/input"."""
+    groups: list[tuple[str, Callable[[str], Iterator[Bench]]]] = [
+        (size, lambda tmp, n=SIZES[size]: sequence_benches(synthetic_sequence(n), tmp))
+        for size in sizes
+    ]
+    groups += [(door, lambda tmp, door=door: door_benches(door, tmp)) for door in doors]
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, benches in groups:
+            for name, fn in benches(tmp_dir):
+                key = f"{name}/{label}"
+                if only and only not in key:
+                    continue
+                try:
+                    results[key] = measure(fn, repeat)
+                except Exception as e:
+                    results[key] = {"error": f"{type(e).__name__}: {e}"}
+                log(format_result(key, results[key]))
+    return {"meta": run_meta(), "results": results}
+
+
+def run_meta() -> dict[str, str]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = "unknown"
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def format_result(key: str, result: dict) -> str:
+    if "error" in result:
+        return f"{key:<40} {result['error']}"
+    return (
+        f"{key:<40} {result['seconds'] * 1000:10.2f} ms"
+        f" {result['peak_bytes'] / 2**20:10.2f} MiB"
+    )
+
+
+def compare_results(
+    old: dict, new: dict, threshold: float
+) -> list[tuple[str, str, float, float]]:
+    """
+    Benchmarks slower or using more memory in `new` than in `old` by more than
+    `threshold`, as (key, metric, old value, new value).
+    """
+    regressions = []
+    for key, new_result in new["results"].items():
+        old_result = old["results"].get(key)
+        if not old_result or "error" in old_result or "error" in new_result:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if new_result[metric] > old_result[metric] * (1 + threshold):
+                regressions.append(
+                    (key, metric, old_result[metric], new_result[metric])
+                )
+    return regressions
+
+
+# Budgets for importing each module in a fresh interpreter, as a multiple of the import
+# time of the third-party modules it can't do without, so they hold on slower or busier
+# machines. The CLI entry point must stay cheap, the ROM backends are tracked so
+# regressions show up.
+IMPORT_BUDGETS = {
+    "gen.__main__": ("click", 4.0),
+    "gen.rom_gen": ("numpy, pydantic, nbtlib", 4.0),
+}
+
+
+def import_time(modules: str) -> float:
+    """
+    Seconds spent importing `modules`, separated by commas, in a fresh interpreter, as
+    reported by `-X importtime`.
+    """
+    names = [name.strip() for name in modules.split(",")]
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(names)}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # lines look like "import time:  self [us] | cumulative | imported package", and
+    # modules imported by an earlier one only count towards that one
+    times = {}
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\S+)$", line)
+        if match and match.group(2) in names:
+            times[match.group(2)] = int(match.group(1)) / 1e6
+    if not times:
+        raise ValueError(f"{modules} missing from -X importtime output")
+    return sum(times.values())
+
+
+def door_generators() -> dict[str, Callable[[bool], list]]:
+    """Functions generating each door's moves, with or without tracing calls."""
+    from doors.hip import hip5jank, hip6, hip10, hip10new, hip789
+
+    def generator(cls, method: str, **attrs) -> Callable[[bool], list]:
+        def generate(trace: bool) -> list:
+            door = cls(trace=trace)
+            for name, value in attrs.items():
+                setattr(door, name, value)
+            getattr(door, method)()
+            return door.moves
+
+        return generate
+
+    return {
+        "5x5hip_jank": generator(hip5jank.Hip5JankSeq, "everything"),
+        "6x6hip": generator(hip6.HipSeq6, "the_whole_shebang"),
+        "7x7hip": generator(
+            hip789.HipSeq789, "the_whole_shebang7", piston_stack_depth=4
+        ),
+        "8x8hip": generator(hip789.HipSeq789, "the_whole_shebang8"),
+        "9x9hip": generator(hip789.HipSeq789, "the_whole_shebang9"),
+        "10x10hip": generator(hip10.HipSeq10, "the_whole_shebang"),
+        "10x10hipnew": generator(hip10new.HipSeq10, "the_whole_shebang"),
+    }
+
+
+@click.group()
+def main():
+    """Benchmarks for ROM generation."""
+
+
+@main.command()
+@click.option(
+    "--sizes",
+    default=",".join(SIZES),
+    help="Comma separated synthetic sequence sizes.",
+    show_default=True,
+)
+@click.option(
+    "--doors/--no-doors", default=True, help="Also benchmark door_meta doors."
+)
+@click.option("--repeat", default=3, help="Runs per measurement, the best is kept.")
+@click.option("--only", help="Only run benchmarks whose key contains this.")
+@click.option("-o", "--output", help="Write the results as JSON to this file.")
+def run(sizes: str, doors: bool, repeat: int, only: str | None, output: str | None):
+    """Time each build stage on synthetic sequences and doors."""
+    size_labels = [size for size in sizes.split(",") if size]
+    unknown = [size for size in size_labels if size not in SIZES]
+    if unknown:
+        raise click.BadParameter(f"unknown sizes {unknown}, pick from {list(SIZES)}")
+
+    results = run_suite(
+        size_labels, find_doors() if doors else [], repeat, only, log=print
+    )
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print("Wrote results to", output)
+
+
+@main.command()
+@click.argument("old", type=click.File())
+@click.argument("new", type=click.File())
+@click.option(
+    "--threshold",
+    default=0.2,
+    show_default=True,
+    help="Allowed slowdown or memory growth, as a fraction.",
+)
+def compare(old, new, threshold: float):
+    """Compare two `run` results, exiting non-zero on regressions."""
+    regressions = compare_results(json.load(old), json.load(new), threshold)
+    for key, metric, old_value, new_value in regressions:
+        print(f"{key:<40} {metric:<10} {old_value:12.4g} -> {new_value:12.4g}")
+    if regressions:
+        sys.exit(1)
+    print("No regressions.")
+
+
+@main.command()
+@click.argument("doors", nargs=-1)
+@click.option("--repeat", default=3, help="Runs per measurement, the best is kept.")
+def encode(doors: tuple[str, ...], repeat: int):
+    """Time encoding DOORS' ROMs. Default: 10x10hip."""
+    for door in doors or ("10x10hip",):
+        bench_encode(door, repeat)
+
+
+@main.command()
+@click.option("--repeat", default=5, help="Runs per measurement, the best is kept.")
+def imports(repeat: int):
+    """Time module imports against their budgets, exiting non-zero if one is over."""
+    over_budget = False
+    for module, (baseline, factor) in IMPORT_BUDGETS.items():
+        seconds = min(import_time(module) for _ in range(repeat))
+        budget = factor * min(import_time(baseline) for _ in range(repeat))
+        over = seconds > budget
+        over_budget |= over
+        status = "OVER BUDGET" if over else "ok"
+        print(
+            f"{module:<16} {seconds * 1000:7.1f} ms  (budget {budget * 1000:.1f} ms,"
+            f" {factor}x {baseline})  {status}"
+        )
+    if over_budget:
+        sys.exit(1)
+
+
+@main.command()
+@click.option("--repeat", default=5, help="Runs per measurement, the best is kept.")
+def tracing(repeat: int):
+    """Time door generators with and without call tree tracing."""
+    print(f"{'door':<14}{'traced ms':>12}{'untraced ms':>14}{'speedup':>10}")
+    for door, generate in door_generators().items():
+        if generate(True) != generate(False):
+            raise AssertionError(f"{door} moves depend on tracing")
+        traced = best_of(lambda: generate(True), repeat)
+        untraced = best_of(lambda: generate(False), repeat)
+        print(
+            f"{door:<14}{traced * 1000:12.2f}{untraced * 1000:14.2f}"
+            f"{traced / untraced:9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+import os
+import runpy
+import sys
+import time
+import traceback
+from dataclasses import dataclass
+from os import path
+
+from doors import DOOR_GENERATORS
+from gen.compress import Compression
+from gen.manifest import Manifest, generator_hash, input_hashes, sequence_file
+from gen.shard import Sharding, index_path
+
+# gen.params and gen.rom_gen pull in pydantic and nbtlib (and with it numpy), so they
+# are only imported once a ROM actually gets built, as is the process pool. This keeps
+# `--help`, usage errors and up to date incremental builds fast.
+
+DOOR_META_DIR = "door_meta"
+DOOR_FILES = ("key.txt", "params.json")
+STDOUT = "-"
+
+
+def resolve_info_dir(info_dir: str) -> str:
+    if path.pathsep in info_dir:
+        return info_dir
+    return f"{DOOR_META_DIR}/{info_dir}"
+
+
+def resolve_out_path(door_name: str, out_path: str | None) -> str:
+    """
+    Default: output_schematics/{door_name}/{door_name}.schem
+    If `out_path` does not contain a file separator, the folder will be output_schematics/{door_name}.
+    "-" stands for stdout and is kept as is.
+    """
+    if out_path == STDOUT:
+        return out_path
+    if out_path is None:
+        out_path = door_name
+
+    if path.sep not in out_path:
+        out_path = f"output_schematics/{door_name}/{out_path}"
+
+    if not out_path.endswith(".schem"):
+        out_path += ".schem"
+    return out_path
+
+
+def built_path(out_path: str, sharding: Sharding | None) -> str:
+    # sharded builds don't write `out_path` itself, but always write their index
+    return out_path if sharding is None else index_path(out_path)
+
+
+def forget_output(info_dir: str, out_path: str):
+    """Drop the manifest entry of an output that's about to be overwritten."""
+    manifest = Manifest.load(path.basename(info_dir))
+    if manifest.forget(out_path):
+        manifest.save()
+
+
+def build_rom(
+    info_dir: str,
+    out_path: str,
+    patch: bool = False,
+    compression: Compression = Compression(),
+    sharding: Sharding | None = None,
+) -> dict:
+    """
+    Build a door's ROM and return its stats.
+
+    With `patch`, only carts that changed since the last patch build are re-encoded, and
+    their indices are returned as the "changed_carts" stat. With `sharding`, the ROM is
+    split into several schematics, returned as the "shards" stat. An `out_path` of "-"
+    writes the schematic to stdout.
+    """
+    from gen.timing import stage
+
+    with stage("import"):
+        from gen.params import read_door
+
+    sequence, params = read_door(info_dir)
+    if out_path == STDOUT:
+        if patch or sharding is not None:
+            raise ValueError("Patched and sharded ROMs can't be written to stdout.")
+        with stage("import"):
+            from gen.rom_gen import write_rom
+
+        return write_rom(sequence, params, sys.stdout.buffer, compression)
+
+    if path.dirname(out_path):
+        os.makedirs(path.dirname(out_path), exist_ok=True)
+    # so an incremental build doesn't trust an output built from other inputs
+    forget_output(info_dir, built_path(out_path, sharding))
+    if sharding is not None:
+        if patch:
+            raise ValueError("Sharded ROMs can't be patched.")
+        with stage("import"):
+            from gen.shard import save_sharded_rom
+
+        return save_sharded_rom(sequence, params, out_path, sharding, compression)
+    if not patch:
+        with stage("import"):
+            from gen.rom_gen import save_rom
+
+        return save_rom(sequence, params, out_path, compression)
+
+    with stage("import"):
+        from gen.patch import patch_rom
+
+    stats, changed = patch_rom(sequence, params, out_path, compression)
+    return {**stats, "changed_carts": changed}
+
+
+def build_rom_incremental(
+    info_dir: str,
+    out_path: str,
+    patch: bool = False,
+    compression: Compression = Compression(),
+    sharding: Sharding | None = None,
+) -> dict | None:
+    """
+    Build the ROM unless its inputs match the manifest.
+
+    Returns the ROM stats, or None if it was up to date.
+    """
+    door_name = path.basename(info_dir)
+    # the same inputs compressed or sharded differently make a different output
+    inputs = {
+        **input_hashes(info_dir),
+        "compression": repr(compression),
+        "sharding": repr(sharding),
+    }
+    out_file = built_path(out_path, sharding)
+    if Manifest.load(door_name).is_current(out_file, inputs):
+        return None
+
+    stats = build_rom(info_dir, out_path, patch, compression, sharding)
+    manifest = Manifest.load(door_name)
+    manifest.record(out_file, inputs)
+    manifest.save()
+    return stats
+
+
+def run_generator(module: str):
+    """Run a door's sequence generator, same as `python -m <module>`."""
+    runpy.run_module(module, run_name="__main__", alter_sys=True)
+
+
+def stale_generators(doors: list[str]) -> dict[str, str]:
+    """Generator modules of `doors` whose source changed since they last ran, with their new hashes."""
+    stale = {}
+    checked = set()
+    for door in doors:
+        module = DOOR_GENERATORS.get(door)
+        if module is None or module in checked:
+            continue
+        checked.add(module)
+        digest = generator_hash(module)
+        if Manifest.load(door).generator != digest:
+            stale[module] = digest
+    return stale
+
+
+def record_generator(module: str, digest: str):
+    # a generator can write several doors, all of them are now up to date
+    for door, door_module in DOOR_GENERATORS.items():
+        if door_module == module:
+            manifest = Manifest.load(door)
+            manifest.generator = digest
+            manifest.save()
+
+
+def update_generators(doors: list[str]) -> list[str]:
+    """Rerun the stale sequence generators of `doors`, returning the modules that ran."""
+    stale = stale_generators(doors)
+    for module, digest in stale.items():
+        run_generator(module)
+        record_generator(module, digest)
+    return list(stale)
+
+
+def find_doors(root: str = DOOR_META_DIR) -> list[str]:
+    """Names of all doors under `root` that have every file needed to build a ROM."""
+
+    def is_door(info_dir: str) -> bool:
+        files = [path.join(info_dir, file) for file in DOOR_FILES]
+        return all(map(path.isfile, [*files, sequence_file(info_dir)]))
+
+    return sorted(name for name in os.listdir(root) if is_door(path.join(root, name)))
+
+
+@dataclass
+class BuildResult:
+    door: str
+    out_path: str
+    seconds: float
+    error: str | None = None
+    skipped: bool = False
+
+
+def build_door(
+    door: str,
+    out_name: str | None = None,
+    incremental: bool = False,
+    compression: Compression = Compression(),
+) -> BuildResult:
+    """Build a door's ROM, catching errors so one bad door doesn't stop a batch."""
+    out_path = resolve_out_path(door, out_name)
+    start = time.perf_counter()
+    error = None
+    skipped = False
+    try:
+        info_dir = resolve_info_dir(door)
+        if incremental:
+            stats = build_rom_incremental(info_dir, out_path, compression=compression)
+            skipped = stats is None
+        else:
+            build_rom(info_dir, out_path, compression=compression)
+    except Exception:
+        error = traceback.format_exc()
+    return BuildResult(door, out_path, time.perf_counter() - start, error, skipped)
+
+
+def build_doors(
+    doors: list[str],
+    out_name: str | None = None,
+    jobs: int | None = None,
+    incremental: bool = False,
+    compression: Compression = Compression(),
+) -> list[BuildResult]:
+    """
+    Build several doors on a process pool, returning results in the given order.
+
+    With `incremental`, stale sequence generators run first, once per module, and ROMs
+    whose inputs are unchanged are skipped. A generator that fails fails its doors.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    from concurrent.futures.process import BrokenProcessPool
+
+    def result(door: str, future) -> BuildResult:
+        # a worker that crashed takes the doors still queued on the pool down with it
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            out_path = resolve_out_path(door, out_name)
+            return BuildResult(door, out_path, 0.0, traceback.format_exc())
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        # tracebacks of the generators that failed, whose doors aren't built
+        failed: dict[str, str] = {}
+        if incremental:
+            stale = stale_generators(doors)
+            runs = {module: pool.submit(run_generator, module) for module in stale}
+            for module, future in runs.items():
+                try:
+                    future.result()
+                except Exception:
+                    failed[module] = traceback.format_exc()
+                else:
+                    record_generator(module, stale[module])
+
+        futures = {
+            door: pool.submit(build_door, door, out_name, incremental, compression)
+            for door in doors
+            if DOOR_GENERATORS.get(door) not in failed
+        }
+        results = []
+        for door in doors:
+            if door in futures:
+                results.append(result(door, futures[door]))
+            else:
+                error = failed[DOOR_GENERATORS[door]]
+                results.append(
+                    BuildResult(door, resolve_out_path(door, out_name), 0.0, error)
+                )
+        return results
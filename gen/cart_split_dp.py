@@ -1,4 +1,8 @@
 from collections import deque
+from itertools import product
+from typing import Iterable, NamedTuple
+
+import numpy as np
 
 
 class SlidingWindowMin:
@@ -28,7 +32,12 @@ class SlidingWindowMin:
 
 
 def cart_split_dp(
-    is_wait: list[bool], min_k: int, max_k: int, m: float, b: float
+    is_wait: list[bool],
+    min_k: int,
+    max_k: int,
+    m: float,
+    b: float,
+    min_carts: int = 1,
 ) -> list[int]:
     """
     Parameters:
@@ -37,12 +46,17 @@ def cart_split_dp(
         max_k: maximum items in a cart
         m: cost function linear
         b: cost function constant
+        min_carts: minimum number of carts
 
     Returns: list of cart sizes, or -(size+1) if wait move optimization was used.
     """
     N = len(is_wait)
     if N == 0:
         return []
+    # Every split of N items has at least N / (max_k + 1) carts, so carts only need to
+    # be counted when that's fewer than min_carts.
+    if min_carts * (max_k + 1) > N:
+        return _cart_split_dp_min_carts(is_wait, min_k, max_k, m, b, min_carts)
 
     is_wait = [False] + is_wait  # make 1-indexed
 
@@ -58,14 +72,15 @@ def cart_split_dp(
 
     window = SlidingWindowMin()
 
-    if min_k == 0:
-        window.add(A[0], 0)
+    # A cart without items only makes sense to cut a wait move, which is handled below.
+    # A[i] isn't known yet when the window reaches it, so it can't be in the window.
+    min_items = max(min_k, 1)
     prev_min = window.get_min()
 
     for i in range(1, N + 1):
-        # Maintain sliding window for A[i-max_k] to A[i-min_k]
-        if i - min_k >= 0:
-            window.add(A[i - min_k], i - min_k)
+        # Maintain sliding window for A[i-max_k] to A[i-min_items]
+        if i - min_items >= 0:
+            window.add(A[i - min_items], i - min_items)
         while window.left_idx < max(0, i - max_k):
             window.remove_left()
 
@@ -80,6 +95,9 @@ def cart_split_dp(
 
         if is_wait[i]:
             prev_val, prev_idx = prev_min
+            if min_k == 0 and A[i - 1] <= prev_val:
+                # empty cart, only there to cut the wait move
+                prev_val, prev_idx = A[i - 1], i - 1
             # min valid k: DP[(i-1)-k] + (m+1)*k + b
             # = (min valid k: A[(i-1)-k]) + (m+1)*(i-1) + b
             val2 = prev_val + (m + 1) * (i - 1) + b
@@ -108,3 +126,210 @@ def cart_split_dp(
             v -= -k
     cart_sizes.reverse()
     return cart_sizes
+
+
+def _cart_split_dp_min_carts(
+    is_wait: list[bool], min_k: int, max_k: int, m: float, b: float, min_carts: int
+) -> list[int]:
+    """`cart_split_dp` with a DP layer for each number of carts up to `min_carts`."""
+    N = len(is_wait)
+    is_wait = [False] + is_wait  # make 1-indexed
+    inf = float("inf")
+
+    # layer c counts splits into c carts, and the last layer C into C or more
+    C = min_carts
+
+    # DP[c][i] = min time with i items total in c carts, cart was just split
+    # A[c][i] = DP[c][i] - (m+1)*i
+    A = [[inf] * (N + 1) for _ in range(C + 1)]
+    A[0][0] = 0
+    # T[c][i] = the value of k that achieves DP[c][i]
+    #         = or -(k+1) if wait move optimization was used
+    T = [[-1] * (N + 1) for _ in range(C + 1)]
+
+    def source(c: int, j: int) -> int:
+        """The layer a cart ending the split into layer c after item j comes from."""
+        if c < C or A[C - 1][j] <= A[C][j]:
+            return c - 1
+        return C
+
+    # windows[c] holds the best splits to add a cart of layer c to
+    windows = [SlidingWindowMin() for _ in range(C + 1)]
+
+    # A cart without items only makes sense to cut a wait move, which is handled below.
+    # A[i] isn't known yet when the window reaches it, so it can't be in the window.
+    min_items = max(min_k, 1)
+    prev_mins = [window.get_min() for window in windows]
+
+    for i in range(1, N + 1):
+        for c in range(1, C + 1):
+            window = windows[c]
+            # Maintain sliding window for A[i-max_k] to A[i-min_items]
+            if i - min_items >= 0:
+                j = i - min_items
+                window.add(A[source(c, j)][j], j)
+            while window.left_idx < max(0, i - max_k):
+                window.remove_left()
+
+            DP = inf
+            cur_min = window.get_min()
+            min_val, min_idx = cur_min
+            if min_val != inf:
+                # min valid k: DP[i-k] + (m+1)*k + b
+                # = (min valid k: A[i-k]) + (m+1)*i + b
+                DP = min_val + (m + 1) * i + b
+                # k = i - (i-k)
+                T[c][i] = i - min_idx
+
+            if is_wait[i]:
+                prev_val, prev_idx = prev_mins[c]
+                empty_val = A[source(c, i - 1)][i - 1]
+                if min_k == 0 and empty_val <= prev_val:
+                    # empty cart, only there to cut the wait move
+                    prev_val, prev_idx = empty_val, i - 1
+                # min valid k: DP[(i-1)-k] + (m+1)*k + b
+                # = (min valid k: A[(i-1)-k]) + (m+1)*(i-1) + b
+                val2 = prev_val + (m + 1) * (i - 1) + b
+                if val2 < DP:
+                    DP = val2
+                    # k+1 = i-(i-1-k)
+                    # negate to indicate wait move
+                    T[c][i] = -(i - prev_idx)
+
+            A[c][i] = DP - (m + 1) * i
+
+            prev_mins[c] = cur_min
+
+    if A[C][N] == inf:
+        return []
+
+    # Backtrack to find cart sizes
+    cart_sizes = []
+    v, c = N, C
+    while v > 0:
+        k = T[c][v]
+        cart_sizes.append(k)
+        v -= abs(k)
+        c = source(c, v)
+    cart_sizes.reverse()
+    return cart_sizes
+
+
+class SplitParams(NamedTuple):
+    min_k: int
+    max_k: int
+    m: float
+    b: float
+
+
+class Split(NamedTuple):
+    params: SplitParams
+    cart_sizes: list[int]
+    cost: float
+
+
+def param_grid(
+    min_k: Iterable[int], max_k: Iterable[int], m: Iterable[float], b: Iterable[float]
+) -> list[SplitParams]:
+    """Every combination of the given parameter values, skipping min_k > max_k."""
+    return [
+        SplitParams(*params)
+        for params in product(min_k, max_k, m, b)
+        if params[0] <= params[1]
+    ]
+
+
+def cart_split_dp_batch(is_wait: list[bool], grid: list[SplitParams]) -> list[Split]:
+    """
+    `cart_split_dp` for many parameter sets at once, vectorized across the sets.
+
+    Gives the same splits as calling `cart_split_dp` for each set, ties included.
+    Cost is inf for sets without a valid split.
+    """
+    N = len(is_wait)
+    P = len(grid)
+    if N == 0 or P == 0:
+        return [Split(SplitParams(*params), [], 0.0) for params in grid]
+
+    min_k = np.array([params[0] for params in grid])
+    max_k = np.array([params[1] for params in grid])
+    m1 = np.array([params[2] for params in grid], dtype=float) + 1
+    b = np.array([params[3] for params in grid], dtype=float)
+    K = max(int(max_k.max()), 0)
+    inf = float("inf")
+    rows = np.arange(P)
+
+    # A[:, K + 1 + i] = DP[i] - (m+1)*i, with K + 1 columns of padding in front so
+    # the window at step i, A[:, i : i + K + 1], covers items i - 1 - K to i - 1.
+    A = np.full((P, K + 2 + N), inf)
+    A[:, K + 1] = 0
+    T = np.full((P, N + 1), -1, dtype=np.int32)
+
+    # Windows are searched back to front, as the scalar version keeps the latest index
+    # on ties. dist[c] = i - j for reversed window column c.
+    dist = np.arange(1, K + 2)
+    # regular carts take k = i - j items, wait carts k = i - 1 - j items plus the wait
+    regular = (dist >= np.maximum(min_k, 1)[:, None]) & (dist <= max_k[:, None])
+    wait = (dist >= min_k[:, None] + 1) & (dist <= max_k[:, None] + 1)
+    # added to a window to leave out the columns that aren't allowed
+    regular = np.where(regular, 0, inf)
+    wait = np.where(wait, 0, inf)
+
+    # cost of the best split of the first i items, for the last i
+    DP = np.full(P, inf)
+    for i in range(1, N + 1):
+        window = A[:, i + K : i - 1 : -1]
+
+        candidates = window + regular
+        col = candidates.argmin(axis=1)
+        min_val = candidates[rows, col]
+        found = min_val != inf
+        DP = np.where(found, min_val + m1 * i + b, inf)
+        T[:, i] = np.where(found, dist[col], -1)
+
+        if is_wait[i - 1]:
+            candidates = window + wait
+            col = candidates.argmin(axis=1)
+            val2 = candidates[rows, col] + m1 * (i - 1) + b
+            better = val2 < DP
+            DP = np.where(better, val2, DP)
+            T[:, i] = np.where(better, -dist[col], T[:, i])
+
+        A[:, K + 1 + i] = DP - m1 * i
+
+    result = []
+    for p, params in enumerate(grid):
+        cart_sizes = []
+        if DP[p] != inf:
+            v = N
+            while v > 0:
+                k = int(T[p, v])
+                cart_sizes.append(k)
+                v -= abs(k)
+            cart_sizes.reverse()
+        result.append(Split(SplitParams(*params), cart_sizes, float(DP[p])))
+    return result
+
+
+def cart_split_dp_sweep(
+    is_wait: list[bool],
+    grid: list[SplitParams],
+    jobs: int | None = None,
+    chunk_size: int = 256,
+) -> list[Split]:
+    """
+    Run `cart_split_dp_batch` over a parameter grid, in chunks on a process pool.
+
+    Small grids, or `jobs=1`, run in this process.
+    """
+    chunks = [grid[i : i + chunk_size] for i in range(0, len(grid), chunk_size)]
+    if jobs == 1 or len(chunks) <= 1:
+        return [
+            split for chunk in chunks for split in cart_split_dp_batch(is_wait, chunk)
+        ]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(cart_split_dp_batch, [is_wait] * len(chunks), chunks)
+        return [split for chunk in results for split in chunk]
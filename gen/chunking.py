@@ -0,0 +1,188 @@
+"""
+Cart, shulker and slot boundaries for ROM partitions.
+
+Boundaries are worked out from item counts, one step per cart or shulker, and only
+then used to slice the sequence, instead of moving items into containers one by one.
+"""
+
+from typing import Iterable
+
+import numpy as np
+
+type Bounds = list[tuple[int, int]]
+
+
+def take(items: list[int], bounds: Iterable[tuple[int, int]]) -> list[list[int]]:
+    return [items[start:stop] for start, stop in bounds]
+
+
+def sizes_to_bounds(sizes: Iterable[int], start: int = 0) -> Bounds:
+    bounds = []
+    for size in sizes:
+        bounds.append((start, start + size))
+        start += size
+    return bounds
+
+
+def split_sizes_to_bounds(sizes: Iterable[int]) -> Bounds:
+    """Bounds for `cart_split_dp` sizes, where -(k + 1) is k items and a dropped wait."""
+    bounds = []
+    start = 0
+    for size in sizes:
+        if size > 0:
+            bounds.append((start, start + size))
+            start += size
+        else:
+            bounds.append((start, start - size - 1))
+            start -= size
+    return bounds
+
+
+def reserved_sizes(
+    num_items: int, capacity: int, reserve: int, reserve_per_chunk: int
+) -> list[int]:
+    """
+    Fill chunks of up to `capacity` items in order, leaving `reserve` items for the
+    chunks still to come. Each new chunk frees up `reserve_per_chunk` of the reserve.
+    """
+    sizes = []
+    remaining = num_items
+    while remaining:
+        reserve -= reserve_per_chunk
+        size = max(0, min(capacity, remaining - reserve, remaining))
+        sizes.append(size)
+        remaining -= size
+    return sizes
+
+
+def rom26_bounds(wait_mask: np.ndarray, cart_len: int = 26) -> Bounds:
+    """
+    Consecutive runs of `cart_len` items, skipping wait moves between carts unless
+    they would fill a whole cart.
+    """
+    num_items = len(wait_mask)
+    non_waits = np.flatnonzero(~wait_mask)
+
+    bounds = []
+    i = 0
+    while i < num_items:
+        bounds.append((i, min(i + cart_len, num_items)))
+        i += cart_len
+        if i < num_items:
+            pos = np.searchsorted(non_waits, i)
+            next_non_wait = int(non_waits[pos]) if pos < len(non_waits) else num_items
+            if not (i + cart_len <= num_items and next_non_wait >= i + cart_len):
+                i = next_non_wait
+    return bounds
+
+
+def cut_wait_bounds(
+    wait_positions: list[int], num_items: int, max_len: int, min_items: int
+) -> Bounds:
+    """
+    Carts that end right before a wait move where possible, so the wait can be dropped.
+
+    The sequence is split into segments on wait moves. A segment that fits in a cart is
+    used whole, together with any wait moves following it that still fit. Longer
+    segments are cut into full carts, splitting the last two evenly when a full cart
+    would leave too few items for the next one. A cart with too few items takes the
+    next segment as well, keeping the wait move between them.
+    """
+    seg_ends = wait_positions + [num_items]
+    next_seg = 1
+    start, stop = 0, seg_ends[0]
+    bounds = []
+
+    while next_seg < len(seg_ends) or stop > start:
+        length = stop - start
+        if length < max_len:
+            # pack as many extra wait moves as we can, one per empty segment
+            while (
+                length < max_len
+                and next_seg < len(seg_ends)
+                and seg_ends[next_seg] == stop + 1
+            ):
+                stop += 1
+                length += 1
+                next_seg += 1
+
+            if length > min_items:
+                bounds.append((start, stop))
+                start = stop
+            else:
+                # need to add more items
+                if next_seg == len(seg_ends):
+                    raise ValueError(
+                        f"The last cart would have {length} items, needs more than"
+                        f" {min_items}."
+                    )
+                stop = seg_ends[next_seg]
+                next_seg += 1
+        elif length < max_len + min_items:
+            # a full cart would leave too few items for the next one
+            half = length // 2
+            bounds.append((start, start + half))
+            start += half
+        else:
+            bounds.append((start, start + max_len))
+            start += max_len
+
+        if start == stop and next_seg < len(seg_ends):
+            # the wait move after the cart is dropped, unless the next segment is empty
+            if seg_ends[next_seg] != stop + 1:
+                start += 1
+            stop = seg_ends[next_seg]
+            next_seg += 1
+
+    return bounds
+
+
+def front_loaded(total: int, count: int, min_size: int, max_size: int) -> list[int]:
+    """
+    `count` sizes from `min_size` to `max_size` adding up to `total`, as large as
+    possible at the front: full ones, then at most one partial one, then minimal ones.
+    """
+    extra = total - count * min_size
+    room = max_size - min_size
+    if extra < 0 or extra > count * room:
+        raise ValueError(
+            f"Can't split {total} into {count} sizes of {min_size}-{max_size}."
+        )
+    if not room:
+        return [min_size] * count
+
+    full, partial = divmod(extra, room)
+    sizes = [max_size] * full
+    if full < count:
+        sizes.append(min_size + partial)
+    return sizes + [min_size] * (count - len(sizes))
+
+
+def rom729_sizes(
+    num_items: int,
+    min_carts: int,
+    min_shulkers_per_cart: int,
+    min_discs_per_shulker: int,
+) -> list[list[int]]:
+    """
+    Number of discs in each shulker of each cart, front loaded, for at least `num_items`
+    discs. The sizes add up to more than `num_items` if the minimums need padding.
+
+    Carts and shulkers always hold at least one item, even if the minimums are 0.
+    """
+    min_shulkers = max(min_shulkers_per_cart, 1)
+    min_discs = max(min_discs_per_shulker, 1)
+
+    num_carts = max(min_carts, -(-num_items // 729), 1)
+    num_shulkers = max(-(-num_items // 27), num_carts * min_shulkers)
+    num_items = max(num_items, num_shulkers * min_discs)
+
+    shulker_sizes = front_loaded(num_items, num_shulkers, min_discs, 27)
+    cart_sizes = front_loaded(num_shulkers, num_carts, min_shulkers, 27)
+
+    carts = []
+    start = 0
+    for size in cart_sizes:
+        carts.append(shulker_sizes[start : start + size])
+        start += size
+    return carts
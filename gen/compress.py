@@ -0,0 +1,188 @@
+"""
+Compression of schematic output.
+
+Schematics are gzipped with Python's gzip module by default. `ParallelGzipWriter`
+compresses blocks of the output on several threads instead, like pigz: each block is
+deflated on its own, primed with the end of the block before it, and flushed to a byte
+boundary, so the compressed blocks join up into a single gzip stream that any gzip
+reader, WorldEdit included, can decompress.
+"""
+
+import gzip
+import os
+import struct
+import time
+import zlib
+from collections import deque
+from dataclasses import dataclass
+from types import TracebackType
+from typing import Protocol, Self
+
+BLOCK_SIZE = 128 * 1024
+# deflate can refer back this far, so each block is primed with this much of the last
+WINDOW_SIZE = 32 * 1024
+
+
+@dataclass(frozen=True)
+class Compression:
+    # 1 is fastest, 9 smallest
+    level: int = 9
+    # False writes plain NBT, for piping into other tools
+    gzipped: bool = True
+    # more than 1 compresses blocks in parallel, 0 uses one thread per CPU
+    threads: int = 1
+
+
+class Output(Protocol):
+    """Where compressed output is written, like an open binary file."""
+
+    def write(self, data: bytes, /) -> object: ...
+
+    def flush(self) -> object: ...
+
+
+class Writer(Protocol):
+    """A binary file object that can only be written to, as `compressor` returns."""
+
+    def write(self, data: bytes, /) -> int: ...
+
+    def flush(self) -> object: ...
+
+    def close(self) -> None: ...
+
+    def __enter__(self) -> Self: ...
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+        /,
+    ) -> object: ...
+
+
+def compressor(fileobj: Output, compression: Compression) -> Writer:
+    """
+    A writer that compresses everything written to it into `fileobj`. Closing it
+    finishes the compressed stream, but leaves `fileobj` open.
+    """
+    if not compression.gzipped:
+        return Uncompressed(fileobj)
+    threads = compression.threads or os.cpu_count() or 1
+    if threads == 1:
+        return gzip.GzipFile(
+            fileobj=fileobj, mode="wb", compresslevel=compression.level
+        )
+    return ParallelGzipWriter(fileobj, compression.level, threads)
+
+
+class Uncompressed:
+    """Writes straight through to `fileobj`, closing only flushes it."""
+
+    def __init__(self, fileobj: Output):
+        self.fileobj = fileobj
+
+    def write(self, data) -> int:
+        self.fileobj.write(data)
+        return len(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+    def close(self):
+        self.fileobj.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ParallelGzipWriter:
+    """Write a gzip stream to `fileobj`, compressing blocks of it on `threads` threads."""
+
+    def __init__(
+        self,
+        fileobj: Output,
+        level: int = 9,
+        threads: int | None = None,
+        block_size: int = BLOCK_SIZE,
+    ):
+        # zlib releases the GIL while compressing, so threads run in parallel
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.fileobj = fileobj
+        self.level = level
+        self.threads = threads or os.cpu_count() or 1
+        self.block_size = block_size
+        self._pool = ThreadPoolExecutor(self.threads)
+        self._pending = deque()
+        self._buffer = bytearray()
+        self._window = b""
+        self._crc = 0
+        self._size = 0
+        self._closed = False
+        self._write_header()
+
+    def _write_header(self):
+        extra_flags = 2 if self.level == 9 else 4 if self.level == 1 else 0
+        # magic, deflate, no flags, mtime, extra flags, unknown OS
+        header = struct.pack(
+            "<BBBBIBB", 0x1F, 0x8B, 8, 0, int(time.time()), extra_flags, 255
+        )
+        self.fileobj.write(header)
+
+    def write(self, data) -> int:
+        if self._closed:
+            raise ValueError("write to closed file")
+        self._buffer += data
+        while len(self._buffer) >= self.block_size:
+            block = bytes(self._buffer[: self.block_size])
+            del self._buffer[: self.block_size]
+            self._submit(block, last=False)
+        return len(data)
+
+    def _submit(self, block: bytes, last: bool):
+        self._crc = zlib.crc32(block, self._crc)
+        self._size += len(block)
+        self._pending.append(
+            self._pool.submit(self._compress, block, self._window, last)
+        )
+        self._window = (self._window + block)[-WINDOW_SIZE:]
+        # keep a few blocks in flight, without buffering the whole output
+        while len(self._pending) > 2 * self.threads:
+            self.fileobj.write(self._pending.popleft().result())
+
+    def _compress(self, block: bytes, window: bytes, last: bool) -> bytes:
+        wbits = -zlib.MAX_WBITS
+        if window:
+            deflate = zlib.compressobj(self.level, zlib.DEFLATED, wbits, zdict=window)
+        else:
+            deflate = zlib.compressobj(self.level, zlib.DEFLATED, wbits)
+        # a sync flush ends the block on a byte boundary without ending the stream
+        return deflate.compress(block) + deflate.flush(
+            zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH
+        )
+
+    def flush(self):
+        """Flush the blocks compressed so far, which doesn't end the current block."""
+        self.fileobj.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._submit(bytes(self._buffer), last=True)
+            while self._pending:
+                self.fileobj.write(self._pending.popleft().result())
+            self.fileobj.write(struct.pack("<II", self._crc, self._size & 0xFFFFFFFF))
+        finally:
+            self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
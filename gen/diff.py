@@ -0,0 +1,104 @@
+from typing import NamedTuple
+
+import numpy as np
+
+
+class Hunk(NamedTuple):
+    """`old[old_start:old_stop]` was replaced by `new[new_start:new_stop]`."""
+
+    old_start: int
+    old_stop: int
+    new_start: int
+    new_stop: int
+
+
+def diff(old: np.ndarray, new: np.ndarray, max_edits: int = 2000) -> list[Hunk]:
+    """
+    Shortest edit script between two sequences of signal strengths, as hunks.
+
+    Common prefixes and suffixes are stripped with numpy before running Myers' diff on
+    the rest. If more than `max_edits` insertions and deletions are needed, the rest is
+    reported as a single hunk instead.
+    """
+    old = np.asarray(old)
+    new = np.asarray(new)
+    prefix = _common_prefix(old, new)
+    suffix = _common_prefix(old[prefix:][::-1], new[prefix:][::-1])
+    old_mid = old[prefix : len(old) - suffix].tolist()
+    new_mid = new[prefix : len(new) - suffix].tolist()
+
+    hunks = _myers(old_mid, new_mid, max_edits)
+    if hunks is None:
+        hunks = [Hunk(0, len(old_mid), 0, len(new_mid))]
+    return [
+        Hunk(
+            h.old_start + prefix,
+            h.old_stop + prefix,
+            h.new_start + prefix,
+            h.new_stop + prefix,
+        )
+        for h in hunks
+    ]
+
+
+def _common_prefix(a: np.ndarray, b: np.ndarray) -> int:
+    n = min(len(a), len(b))
+    mismatches = np.flatnonzero(a[:n] != b[:n])
+    return int(mismatches[0]) if len(mismatches) else n
+
+
+def _myers(a: list[int], b: list[int], max_edits: int) -> list[Hunk] | None:
+    n, m = len(a), len(b)
+    if n == 0 and m == 0:
+        return []
+    if n == 0 or m == 0:
+        return [Hunk(0, n, 0, m)]
+
+    offset = n + m + 1
+    # v[offset + k] = furthest x reached on diagonal k = x - y
+    v = [0] * (2 * offset + 1)
+    trace = []
+    for d in range(min(n + m, max_edits) + 1):
+        trace.append(v[offset - d - 1 : offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[offset + k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return None
+
+
+def _backtrack(trace: list[list[int]], n: int, m: int) -> list[Hunk]:
+    # (x, y) before each deletion (x + 1) or insertion (y + 1), from the end
+    edits = []
+    x, y = n, m
+    for d in range(len(trace) - 1, 0, -1):
+        # trace[d] holds diagonals -d - 1 to d + 1 as they were before step d
+        v = trace[d]
+        k = x - y
+        if k == -d or (k != d and v[k - 1 + d + 1] < v[k + 1 + d + 1]):
+            prev_k = k + 1
+            x_start = v[prev_k + d + 1]
+            edits.append((x_start, x_start - prev_k, False))
+        else:
+            prev_k = k - 1
+            x_start = v[prev_k + d + 1]
+            edits.append((x_start, x_start - prev_k, True))
+        x, y = x_start, x_start - prev_k
+    edits.reverse()
+
+    hunks = []
+    for x, y, is_deletion in edits:
+        x_stop, y_stop = (x + 1, y) if is_deletion else (x, y + 1)
+        if hunks and hunks[-1].old_stop == x and hunks[-1].new_stop == y:
+            hunks[-1] = hunks[-1]._replace(old_stop=x_stop, new_stop=y_stop)
+        else:
+            hunks.append(Hunk(x, x_stop, y, y_stop))
+    return hunks
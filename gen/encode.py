@@ -1,4 +1,9 @@
-from typing import Literal
+import io
+import struct
+from functools import cache
+from typing import Iterator, Literal
+
+from nbtlib.tag import Base, Compound, List
 
 from .schem_types import Minecart
 from gen.schem_types import ShulkerItem
@@ -76,24 +81,24 @@ def encode_list_as_items(
 
 def encode_rom1(
     carts: list[int], cart_pos: list[float], add_stop_move: bool
-) -> list[Minecart]:
+) -> Iterator[Minecart]:
     carts = carts if not add_stop_move else carts + [0]
-    return [encode_as_cart(ss, cart_pos) for ss in carts]
+    return (encode_as_cart(ss, cart_pos) for ss in carts)
 
 
 def encode_rom27(
     carts: list[list[int]], cart_pos: list[float], medium: Literal["shulker", "disc"]
-) -> list[Minecart]:
-    return [
+) -> Iterator[Minecart]:
+    return (
         Minecart(pos=cart_pos, items=encode_list_as_items(cart, medium=medium))
         for cart in carts
-    ]
+    )
 
 
 def encode_rom729(
     carts: list[list[list[int]]], cart_pos: list[float]
-) -> list[Minecart]:
-    return [
+) -> Iterator[Minecart]:
+    return (
         Minecart(
             pos=cart_pos,
             items=[
@@ -108,4 +113,108 @@ def encode_rom729(
             ],
         )
         for cart in carts
-    ]
+    )
+
+
+# Pre-serialized fragments. There are only 16 signal strengths, so every cart, item and
+# shulker that can appear in a ROM is serialized once and spliced together as bytes.
+
+Medium = Literal["shulker", "disc"]
+CartPos = tuple[float, ...]
+
+_COMPOUND_SUBTYPE = bytes([Compound.tag_id])
+
+
+def to_nbt_bytes(tag: Base) -> bytes:
+    out = io.BytesIO()
+    tag.write(out)
+    return out.getvalue()
+
+
+def _split_list(template: bytes, name: str) -> tuple[bytes, bytes, bytes]:
+    """
+    Split a serialized compound around its empty list tag `name`.
+
+    Returns the bytes before the list's subtype, the subtype nbtlib writes for an empty
+    list and the bytes after its length prefix.
+    """
+    encoded_name = name.encode("utf-8")
+    marker = struct.pack(">bH", List.tag_id, len(encoded_name)) + encoded_name
+    start = template.index(marker) + len(marker)
+    return template[:start], template[start : start + 1], template[start + 5 :]
+
+
+def _splice(halves: tuple[bytes, bytes, bytes], elements: list[bytes]) -> bytes:
+    head, empty_subtype, tail = halves
+    subtype = _COMPOUND_SUBTYPE if elements else empty_subtype
+    return b"".join([head, subtype, struct.pack(">i", len(elements)), *elements, tail])
+
+
+@cache
+def cart1_bytes(ss: int, cart_pos: CartPos) -> bytes:
+    return to_nbt_bytes(encode_as_cart(ss, list(cart_pos)))
+
+
+@cache
+def item_bytes(medium: Medium, ss: int, slot: int) -> bytes:
+    gen_fn = encode_as_shulker if medium == "shulker" else encode_as_cart_disc
+    return to_nbt_bytes(gen_fn(ss, slot))
+
+
+@cache
+def disc_shulker_bytes(ss: int, slot: int) -> bytes:
+    return to_nbt_bytes(encode_as_disc_shulker(ss, slot))
+
+
+@cache
+def _cart_halves(cart_pos: CartPos) -> tuple[bytes, bytes, bytes]:
+    return _split_list(to_nbt_bytes(Minecart(pos=list(cart_pos))), "Items")
+
+
+@cache
+def _shulker_halves(slot: int) -> tuple[bytes, bytes, bytes]:
+    return _split_list(to_nbt_bytes(CartItem.shulker(slot)), "minecraft:container")
+
+
+def cart_bytes(items: list[bytes], cart_pos: CartPos) -> bytes:
+    return _splice(_cart_halves(cart_pos), items)
+
+
+def cart27_bytes(cart: list[int], cart_pos: CartPos, medium: Medium) -> bytes:
+    return cart_bytes(
+        [item_bytes(medium, ss, slot) for slot, ss in enumerate(cart)], cart_pos
+    )
+
+
+def encode_rom1_bytes(
+    carts: list[int], cart_pos: list[float], add_stop_move: bool
+) -> Iterator[bytes]:
+    carts = carts if not add_stop_move else carts + [0]
+    pos = tuple(cart_pos)
+    return (cart1_bytes(ss, pos) for ss in carts)
+
+
+def encode_rom27_bytes(
+    carts: list[list[int]], cart_pos: list[float], medium: Medium
+) -> Iterator[bytes]:
+    pos = tuple(cart_pos)
+    return (cart27_bytes(cart, pos, medium) for cart in carts)
+
+
+def encode_rom729_bytes(
+    carts: list[list[list[int]]], cart_pos: list[float]
+) -> Iterator[bytes]:
+    pos = tuple(cart_pos)
+    return (
+        cart_bytes(
+            [
+                _splice(
+                    _shulker_halves(shulker_idx),
+                    [disc_shulker_bytes(ss, slot) for slot, ss in enumerate(shulker)],
+                )
+                for shulker_idx, shulker in enumerate(cart)
+            ],
+            pos,
+        )
+        for cart in carts
+    )
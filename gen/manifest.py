@@ -0,0 +1,141 @@
+"""
+Content hashes of a door's build inputs, used to skip rebuilds when nothing changed.
+
+Each door keeps a manifest at output_schematics/{door_name}/manifest.json holding the hash
+of its sequence generator's source, and for every output the hashes of the inputs it was
+built from.
+"""
+
+import hashlib
+import json
+import os
+from importlib.util import find_spec
+from os import path
+
+MANIFEST_NAME = "manifest.json"
+
+
+def hash_bytes(*chunks: bytes) -> str:
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(len(chunk).to_bytes(8, "big"))
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_files(paths: list[str]) -> str:
+    chunks = []
+    for file_path in paths:
+        with open(file_path, "rb") as f:
+            chunks.append(f.read())
+    return hash_bytes(*chunks)
+
+
+def generator_version() -> str:
+    """Hash of the ROM generator's own source, so code changes invalidate old outputs."""
+    gen_dir = path.dirname(__file__)
+    sources = sorted(name for name in os.listdir(gen_dir) if name.endswith(".py"))
+    return hash_files([path.join(gen_dir, name) for name in sources])
+
+
+def module_sources(module: str, package: str = "doors") -> list[str]:
+    """Source files of `module` and every module of `package` it imports, recursively."""
+    import ast
+
+    seen: dict[str, str] = {}
+    pending = [module]
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        spec = find_spec(name)
+        if spec is None or spec.origin is None:
+            continue
+        seen[name] = spec.origin
+
+        with open(spec.origin, "r") as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                imported = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                imported = [node.module]
+            else:
+                continue
+            pending += [name for name in imported if name.split(".")[0] == package]
+    return sorted(seen.values())
+
+
+def generator_hash(module: str) -> str:
+    return hash_files(module_sources(module))
+
+
+def sequence_file(info_dir: str) -> str:
+    """
+    The sequence file a door is built from.
+
+    The binary sequence.seqbin is preferred, unless sequence.txt was written after it.
+    """
+    text_path = path.join(info_dir, "sequence.txt")
+    binary_path = path.join(info_dir, "sequence.seqbin")
+    if not path.isfile(binary_path):
+        return text_path
+    if path.isfile(text_path) and path.getmtime(text_path) > path.getmtime(binary_path):
+        return text_path
+    return binary_path
+
+
+def input_hashes(info_dir: str) -> dict[str, str]:
+    input_files = [
+        path.join(info_dir, "key.txt"),
+        sequence_file(info_dir),
+        path.join(info_dir, "params.json"),
+    ]
+    hashes = {path.basename(file): hash_files([file]) for file in input_files}
+    hashes["generator_version"] = generator_version()
+    return hashes
+
+
+class Manifest:
+    def __init__(self, door_name: str, data: dict | None = None):
+        self.door_name = door_name
+        self.data = data or {"generator": None, "outputs": {}}
+
+    @staticmethod
+    def manifest_path(door_name: str) -> str:
+        return path.join("output_schematics", door_name, MANIFEST_NAME)
+
+    @classmethod
+    def load(cls, door_name: str) -> "Manifest":
+        try:
+            with open(cls.manifest_path(door_name), "r") as f:
+                return cls(door_name, json.load(f))
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cls(door_name)
+
+    def save(self):
+        manifest_path = self.manifest_path(self.door_name)
+        os.makedirs(path.dirname(manifest_path), exist_ok=True)
+        tmp_path = manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, manifest_path)
+
+    @property
+    def generator(self) -> str | None:
+        return self.data["generator"]
+
+    @generator.setter
+    def generator(self, value: str):
+        self.data["generator"] = value
+
+    def is_current(self, out_path: str, inputs: dict[str, str]) -> bool:
+        key = path.abspath(out_path)
+        return path.isfile(out_path) and self.data["outputs"].get(key) == inputs
+
+    def record(self, out_path: str, inputs: dict[str, str]):
+        self.data["outputs"][path.abspath(out_path)] = inputs
+
+    def forget(self, out_path: str) -> bool:
+        """Drop the inputs recorded for `out_path`, returning whether there were any."""
+        return self.data["outputs"].pop(path.abspath(out_path), None) is not None
@@ -0,0 +1,117 @@
+import os
+from contextlib import contextmanager
+from typing import BinaryIO, Iterable, Iterator
+
+from nbtlib.tag import BYTE, INT, Compound, List, write_numeric, write_string
+
+from gen.compress import Compression, Writer, compressor
+from gen.schem_types import Minecart, Schematic
+from gen.timing import TimedWriter, active_profiler, stage, timed_iter
+
+
+def write_schem(
+    fileobj: Writer,
+    carts: Iterable[Minecart | bytes],
+    num_carts: int,
+    origin: list[int] | None = None,
+):
+    """
+    Write an uncompressed schematic to `fileobj`, serializing `carts` one at a time.
+
+    The output is identical to `carts_schem(list(carts), origin).write(fileobj)`, but only
+    the cart currently being written is held in memory. NBT lists are length-prefixed, so
+    the number of carts has to be known up front. Carts may also be given pre-serialized,
+    as produced by the `encode_rom*_bytes` functions.
+    """
+    schem = Schematic.empty()
+    if origin:
+        schem.set_origin(origin)
+
+    # root compound of the file, which only holds the "Schematic" compound
+    write_numeric(BYTE, Compound.tag_id, fileobj)
+    write_string("", fileobj)
+    write_numeric(BYTE, Compound.tag_id, fileobj)
+    write_string("Schematic", fileobj)
+
+    for name, tag in schem["Schematic"].items():
+        write_numeric(BYTE, tag.tag_id, fileobj)
+        write_string(name, fileobj)
+        if name == "Entities":
+            _write_entities(fileobj, carts, num_carts)
+        else:
+            tag.write(fileobj)
+
+    fileobj.write(Compound.end_tag)
+    fileobj.write(Compound.end_tag)
+
+
+def _write_entities(fileobj: Writer, carts: Iterable[Minecart | bytes], num_carts: int):
+    write_numeric(BYTE, List[Minecart].subtype.tag_id, fileobj)
+    write_numeric(INT, num_carts, fileobj)
+
+    written = 0
+    for cart in carts:
+        if isinstance(cart, bytes):
+            fileobj.write(cart)
+        else:
+            cart.write(fileobj)
+        written += 1
+
+    if written != num_carts:
+        raise ValueError(f"Expected {num_carts} carts, got {written}.")
+
+
+def dump_schem(
+    fileobj: BinaryIO,
+    carts: Iterable[Minecart | bytes],
+    num_carts: int,
+    origin: list[int] | None = None,
+    compression: Compression = Compression(),
+):
+    """
+    Stream a schematic to the binary file object `fileobj`. By default it is gzipped the
+    same way `File.save` writes it. `fileobj` is left open.
+    """
+    profiler = active_profiler()
+    if profiler is None:
+        with compressor(fileobj, compression) as compressed:
+            write_schem(compressed, carts, num_carts, origin)
+        return
+
+    # time compression and the file writes under it separately from assembling the
+    # schematic
+    compressed = compressor(TimedWriter(fileobj, "write", profiler), compression)
+    with TimedWriter(compressed, "compress", profiler) as compressed, stage("assemble"):
+        write_schem(compressed, timed_iter("encode", carts), num_carts, origin)
+
+
+@contextmanager
+def replace_file(path: str) -> Iterator[BinaryIO]:
+    """
+    Open a temporary file next to `path` for writing, which replaces `path` once the
+    block finishes. If it raises, the partial file is removed and `path` is kept.
+    """
+    tmp_path = path + ".tmp"
+    try:
+        with open(tmp_path, "wb") as fileobj:
+            yield fileobj
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_schem(
+    path: str,
+    carts: Iterable[Minecart | bytes],
+    num_carts: int,
+    origin: list[int] | None = None,
+    compression: Compression = Compression(),
+):
+    """
+    Stream a schematic to `path`, see `dump_schem`. A temporary file only replaces
+    `path` once the whole schematic is written.
+    """
+    with replace_file(path) as fileobj:
+        dump_schem(fileobj, carts, num_carts, origin, compression)
@@ -1,8 +1,15 @@
+import mmap
 from dataclasses import dataclass
+from functools import cache, cached_property
+from os import path
 
+import numpy as np
+from numpy.typing import ArrayLike, NDArray
 from pydantic import BaseModel, Field, TypeAdapter
 from typing import Annotated, Literal
 
+from gen.timing import stage
+
 
 class CartRomParams(BaseModel):
     cart_pos: list[float] = [0.5, 0, 0.5]
@@ -20,6 +27,11 @@ class Rom27(CartRomParams):
     medium: Literal["shulker", "disc"]
     min_items_per_cart: int = 0
     cut_wait_moves: bool = False
+    # "dp" finds the cart split with the lowest estimated read time, where a cart of k
+    # items costs (dp_m + 1) * k + dp_b. See gen.cart_split_dp.
+    partition: Literal["greedy", "dp"] = "greedy"
+    dp_m: float = 0
+    dp_b: float = 1
 
     def min_items(self):
         return self.min_carts * self.min_items_per_cart
@@ -40,43 +52,137 @@ RomParams = Rom1 | Rom27 | Rom26 | Rom729
 RomParamsAnnotated = Annotated[RomParams, Field(discriminator="rom_type")]
 
 
+@cache
+def params_adapter() -> TypeAdapter[RomParams]:
+    return TypeAdapter(RomParamsAnnotated)
+
+
 def parse_params(contents: str) -> RomParams:
     """Parse the parameters from a string."""
-    return TypeAdapter(RomParamsAnnotated).validate_json(contents, strict=True)
+    return params_adapter().validate_json(contents, strict=True)
 
 
 def parse_encoding(contents: str) -> dict[str, int]:
-    lines = [
-        line.strip().split()
-        for line in contents.split("\n")
-        if len(line.split()) == 2 and line.split()[1] != ""
-    ]
-
-    return {name.lower(): int(ss) for ss, name in lines}
+    key = {}
+    for line in contents.split("\n"):
+        parts = line.split()
+        if len(parts) == 2:
+            ss, name = parts
+            key[name.lower()] = int(ss)
+    return key
 
 
 def parse_move_list(contents: str) -> list[str]:
     return [line.strip() for line in contents.split("\n") if line]
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, eq=False, init=False)
 class Sequence:
-    ss_list: list[int]
+    """
+    Signal strengths of a door's moves, stored as a compact uint8 array.
+
+    Views derived from it, like where the wait moves are, are computed once and cached.
+    """
+
+    ss: NDArray[np.uint8]
     wait_move: int | None
 
-    def with_min_items(self, min_length: int) -> list[int]:
-        if len(self.ss_list) >= min_length:
-            return self.ss_list
+    def __init__(self, ss: ArrayLike, wait_move: int | None):
+        # signal strengths can be given as any array-like, like a list
+        object.__setattr__(self, "ss", np.asarray(ss, dtype=np.uint8))
+        object.__setattr__(self, "wait_move", wait_move)
+
+    def __len__(self) -> int:
+        return len(self.ss)
+
+    @cached_property
+    def ss_list(self) -> list[int]:
+        return self.ss.tolist()
+
+    @cached_property
+    def wait_mask(self) -> NDArray[np.bool_]:
+        if self.wait_move is None:
+            return np.zeros(len(self.ss), dtype=np.bool_)
+        return self.ss == self.wait_move
+
+    @cached_property
+    def wait_runs(self) -> tuple[NDArray[np.intp], NDArray[np.intp]]:
+        """Start index and length of every run of consecutive wait moves."""
+        edges = np.diff(self.wait_mask.astype(np.int8), prepend=0, append=0)
+        starts = np.flatnonzero(edges == 1)
+        return starts, np.flatnonzero(edges == -1) - starts
+
+    @cached_property
+    def item_counts(self) -> NDArray[np.uint8]:
+        """Item stacks each move takes in a cart, from `ss_to_num_stacks`."""
+        from gen.encode import ss_to_num_stacks
+
+        lookup = np.zeros(16, dtype=np.uint8)
+        for ss, num_stacks in ss_to_num_stacks.items():
+            lookup[ss] = num_stacks
+        return lookup[self.ss]
+
+    def padded(self, min_length: int) -> "Sequence":
+        """This sequence, extended with wait moves to at least `min_length` moves."""
+        if len(self.ss) >= min_length:
+            return self
         if self.wait_move is None:
             raise ValueError(
                 "Sequence is not long enough, and no wait move is defined."
             )
-        return self.ss_list + [self.wait_move] * (min_length - len(self.ss_list))
+        padding = np.full(min_length - len(self.ss), self.wait_move, dtype=np.uint8)
+        return Sequence(np.concatenate([self.ss, padding]), self.wait_move)
+
+    def with_min_items(self, min_length: int) -> list[int]:
+        return self.padded(min_length).ss_list
+
 
+def parse_sequence(
+    encoding_file: str, sequence_file: str | bytes | mmap.mmap
+) -> Sequence:
+    """
+    Parse a sequence, either as text with one move name per line or as a `.seqbin` buffer.
 
-def parse_sequence(encoding_file: str, sequence_file: str) -> Sequence:
+    Binary sequences are unpacked directly, without looking up any move names.
+    """
     key = parse_encoding(encoding_file)
-    moves = parse_move_list(sequence_file)
-    ss_list = [key[move.lower()] for move in moves]
-    wait_move = key.get("wait")
-    return Sequence(ss_list, wait_move)
+    if not isinstance(sequence_file, str):
+        from gen.seqbin import unpack_sequence
+
+        return Sequence(*unpack_sequence(sequence_file, key))
+
+    moves = np.array(sequence_file.lower().split(), dtype=np.str_)
+    # look up each distinct move name once, then map the whole sequence in one go
+    names, inverse = np.unique(moves, return_inverse=True)
+    lookup = np.array([key[name] for name in names.tolist()], dtype=np.uint8)
+    return Sequence(lookup[inverse], key.get("wait"))
+
+
+def read_sequence(info_dir: str) -> Sequence:
+    """Read a door's sequence, memory-mapping it if it is stored as a `.seqbin`."""
+    from gen.manifest import sequence_file
+
+    with stage("read"), open(path.join(info_dir, "key.txt"), "r") as f:
+        encoding_file = f.read()
+
+    sequence_path = sequence_file(info_dir)
+    if sequence_path.endswith(".seqbin"):
+        from gen.seqbin import map_file
+
+        # pages of the file are only read as they are parsed
+        with map_file(sequence_path) as data, stage("parse_sequence"):
+            return parse_sequence(encoding_file, data)
+
+    with stage("read"), open(sequence_path, "r") as f:
+        contents = f.read()
+    with stage("parse_sequence"):
+        return parse_sequence(encoding_file, contents)
+
+
+def read_door(info_dir: str) -> tuple[Sequence, RomParams]:
+    """Read and parse the key, sequence and params files of a door directory."""
+    with stage("read"), open(path.join(info_dir, "params.json"), "r") as f:
+        contents = f.read()
+    with stage("parse_params"):
+        params = parse_params(contents)
+    return read_sequence(info_dir), params
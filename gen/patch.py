@@ -0,0 +1,168 @@
+"""
+Patch builds, which only re-encode the carts a sequence change touches.
+
+A patch build records the sequence, params and serialized carts of its output in
+{out_path without .schem}.patch.npz. The next patch build of the same output diffs the
+new moves against the recorded ones, re-encodes the carts overlapping a change, or
+whose bounds moved, and copies the recorded bytes of every other cart.
+"""
+
+import os
+from os import path
+from typing import NamedTuple
+
+import numpy as np
+
+from gen.chunking import Bounds
+from gen.compress import Compression
+from gen.diff import Hunk, diff
+from gen.encode import cart1_bytes, cart27_bytes
+from gen.manifest import generator_version
+from gen.nbt_stream import save_schem
+from gen.params import Rom1, Rom26, Rom27, RomParams, Sequence
+from gen.rom_gen import CartLayout, cart_layout, rom27_stats
+from gen.timing import stage
+
+PATCH_SUFFIX = ".patch.npz"
+NO_WAIT_MOVE = -1
+
+# ROM types that patch builds support
+PatchableParams = Rom1 | Rom26 | Rom27
+
+
+class PatchState(NamedTuple):
+    sequence: Sequence
+    # params and generator version the carts were built with
+    built_with: str
+    carts: list[bytes]
+
+
+def state_path(out_path: str) -> str:
+    return path.splitext(out_path)[0] + PATCH_SUFFIX
+
+
+def built_with(params: RomParams) -> str:
+    return f"{generator_version()} {params.model_dump_json()}"
+
+
+def load_state(out_path: str) -> PatchState | None:
+    try:
+        with np.load(state_path(out_path)) as state:
+            wait_move = int(state["wait_move"])
+            sequence = Sequence(
+                state["ss"], None if wait_move == NO_WAIT_MOVE else wait_move
+            )
+            offsets = state["offsets"].tolist()
+            data = state["data"].tobytes()
+            built = str(state["built_with"])
+    except FileNotFoundError:
+        return None
+    carts = [data[start:stop] for start, stop in zip(offsets, offsets[1:])]
+    return PatchState(sequence, built, carts)
+
+
+def save_state(out_path: str, state: PatchState):
+    offsets = np.cumsum([0] + [len(cart) for cart in state.carts])
+    wait_move = state.sequence.wait_move
+    tmp_path = state_path(out_path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez(
+            f,
+            ss=state.sequence.ss,
+            wait_move=NO_WAIT_MOVE if wait_move is None else wait_move,
+            built_with=state.built_with,
+            offsets=offsets,
+            data=np.frombuffer(b"".join(state.carts), dtype=np.uint8),
+        )
+    os.replace(tmp_path, state_path(out_path))
+
+
+def changed_carts(
+    hunks: list[Hunk], old_bounds: Bounds, new_bounds: Bounds
+) -> list[int]:
+    """
+    Indices of the new carts that differ from the old cart at the same index.
+
+    A cart is unchanged if no hunk overlaps it and the old cart at its index covers the
+    same moves, shifted by the length changes of the hunks before it.
+    """
+    changed = []
+    h = 0
+    # new position - old position, for moves after hunks[:h]
+    shift = 0
+    for i, (start, stop) in enumerate(new_bounds):
+        while h < len(hunks) and hunks[h].new_stop <= start:
+            hunk = hunks[h]
+            shift += (hunk.new_stop - hunk.new_start) - (hunk.old_stop - hunk.old_start)
+            h += 1
+        overlaps = h < len(hunks) and hunks[h].new_start < stop
+        if (
+            overlaps
+            or i >= len(old_bounds)
+            or old_bounds[i] != (start - shift, stop - shift)
+        ):
+            changed.append(i)
+    return changed
+
+
+def encode_cart(cart: list[int], params: PatchableParams) -> bytes:
+    pos = tuple(params.cart_pos)
+    if isinstance(params, Rom1):
+        return cart1_bytes(cart[0], pos)
+    return cart27_bytes(cart, pos, params.medium)
+
+
+def patch_carts(
+    layout: CartLayout, params: PatchableParams, previous: PatchState | None
+) -> tuple[list[bytes], list[int]]:
+    """Serialized carts for `layout`, and the indices of the ones that were re-encoded."""
+    if previous is None or previous.built_with != built_with(params):
+        changed = list(range(len(layout.carts)))
+        with stage("encode"):
+            carts = [encode_cart(cart, params) for cart in layout.carts]
+        return carts, changed
+
+    with stage("partition"):
+        old_layout = cart_layout(previous.sequence, params)
+    with stage("diff"):
+        hunks = diff(np.array(old_layout.moves), np.array(layout.moves))
+        changed = changed_carts(hunks, old_layout.bounds, layout.bounds)
+
+    carts = previous.carts[: len(layout.carts)]
+    carts += [b""] * (len(layout.carts) - len(carts))
+    with stage("encode"):
+        for i in changed:
+            carts[i] = encode_cart(layout.carts[i], params)
+    return carts, changed
+
+
+def patch_rom(
+    sequence: Sequence,
+    params: RomParams,
+    out_path: str,
+    compression: Compression = Compression(),
+) -> tuple[dict[str, float], list[int]]:
+    """
+    Write the ROM to `out_path`, reusing the carts of its previous patch build.
+
+    Returns the ROM stats and the indices of the carts that changed.
+    """
+    if not isinstance(params, (Rom1, Rom26, Rom27)):
+        raise ValueError(f"{params.rom_type} ROMs can't be patched.")
+
+    with stage("partition"):
+        layout = cart_layout(sequence, params)
+    with stage("read"):
+        previous = load_state(out_path) if path.isfile(out_path) else None
+    carts, changed = patch_carts(layout, params, previous)
+
+    # only cart26 ROMs use the origin, as in a full build
+    origin = params.origin if isinstance(params, Rom26) else None
+    save_schem(out_path, carts, len(carts), origin, compression)
+    with stage("write"):
+        save_state(out_path, PatchState(sequence, built_with(params), carts))
+
+    stats: dict[str, float] = {"carts": len(carts)}
+    if isinstance(params, Rom27):
+        stats |= rom27_stats(layout.carts, params)
+    return stats, changed
@@ -1,97 +1,263 @@
-from collections import deque
+import io
+from typing import Any, BinaryIO, Iterable, Literal, NamedTuple, overload
 
+import numpy as np
 from nbtlib import File
 
-from gen.encode import encode_rom1, encode_rom27, encode_rom729
+from gen.cart_split_dp import cart_split_dp
+from gen.chunking import (
+    Bounds,
+    cut_wait_bounds,
+    reserved_sizes,
+    rom26_bounds,
+    rom729_sizes,
+    sizes_to_bounds,
+    split_sizes_to_bounds,
+    take,
+)
+from gen.compress import Compression
+from gen.encode import (
+    encode_rom1,
+    encode_rom1_bytes,
+    encode_rom27,
+    encode_rom27_bytes,
+    encode_rom729,
+    encode_rom729_bytes,
+)
+from gen.nbt_stream import dump_schem, replace_file
 from gen.schem_types import Minecart, Schematic
+from gen.timing import stage
 from .params import Rom1, Rom26, Rom27, Rom729, RomParams, Sequence
 
 
+class RomCarts[C: Minecart | bytes](NamedTuple):
+    """
+    Carts making up a ROM, encoded lazily so they can be streamed.
+
+    With `serialized=True` the carts are spliced together from cached NBT fragments
+    instead of being built as nbtlib compounds, so `C` is bytes.
+    """
+
+    carts: Iterable[C]
+    num_carts: int
+    origin: list[int] | None = None
+    stats: dict[str, float] | None = None
+
+
 def gen_rom(sequence: Sequence, params: RomParams) -> File:
+    rom = rom_carts(sequence, params)
+    return carts_schem(rom.carts, rom.origin)
+
+
+def gen_rom_bytes(
+    sequence: Sequence, params: RomParams, compression: Compression = Compression()
+) -> bytes:
+    """The ROM's schematic file contents, as `save_rom` would write them."""
+    out = io.BytesIO()
+    write_rom(sequence, params, out, compression)
+    return out.getvalue()
+
+
+def save_rom(
+    sequence: Sequence,
+    params: RomParams,
+    path: str,
+    compression: Compression = Compression(),
+) -> dict[str, float]:
+    """
+    Generate a ROM and stream it to `path` without building the full schematic. An
+    existing file at `path` is kept if generating fails partway.
+
+    Returns stats about the ROM, like its cart count.
+    """
+    with replace_file(path) as fileobj:
+        return write_rom(sequence, params, fileobj, compression)
+
+
+def write_rom(
+    sequence: Sequence,
+    params: RomParams,
+    fileobj: BinaryIO,
+    compression: Compression = Compression(),
+) -> dict[str, float]:
+    """Generate a ROM and stream it to the binary file object `fileobj`, see `save_rom`."""
+    rom = rom_carts(sequence, params, serialized=True)
+    dump_schem(fileobj, rom.carts, rom.num_carts, rom.origin, compression)
+    return {"carts": rom.num_carts, **(rom.stats or {})}
+
+
+@overload
+def rom_carts(
+    sequence: Sequence, params: RomParams, serialized: Literal[False] = False
+) -> RomCarts[Minecart]: ...
+
+
+@overload
+def rom_carts(
+    sequence: Sequence, params: RomParams, serialized: Literal[True]
+) -> RomCarts[bytes]: ...
+
+
+@overload
+def rom_carts(
+    sequence: Sequence, params: RomParams, serialized: bool
+) -> RomCarts[Minecart] | RomCarts[bytes]: ...
+
+
+def rom_carts(
+    sequence: Sequence, params: RomParams, serialized: bool = False
+) -> RomCarts[Any]:
     if isinstance(params, Rom1):
-        return gen_rom1(sequence, params)
+        return carts_rom1(sequence, params, serialized)
     elif isinstance(params, Rom27):
-        return gen_rom27(sequence, params)
+        return carts_rom27(sequence, params, serialized)
     elif isinstance(params, Rom26):
-        return gen_rom26(sequence, params)
+        return carts_rom26(sequence, params, serialized)
     elif isinstance(params, Rom729):
-        return gen_rom729(sequence, params)
+        return carts_rom729(sequence, params, serialized)
     raise NotImplementedError
 
 
-def carts_schem(carts: list[Minecart], origin: list[int] | None = None) -> File:
+class CartLayout(NamedTuple):
+    """Carts of a ROM that holds one list of moves per cart, and where they come from."""
+
+    # moves the carts are cut from, including padding
+    moves: list[int]
+    # the slice of `moves` in each cart
+    bounds: Bounds
+    # contents of each cart, with any moves the ROM type adds
+    carts: list[list[int]]
+
+
+def cart_layout(sequence: Sequence, params: RomParams) -> CartLayout:
+    if isinstance(params, Rom1):
+        return layout_rom1(sequence, params)
+    elif isinstance(params, Rom27):
+        return layout_rom27(sequence, params)
+    elif isinstance(params, Rom26):
+        return layout_rom26(sequence, params)
+    raise NotImplementedError(f"No cart layout for {params.rom_type} ROMs.")
+
+
+def layout_rom1(sequence: Sequence, params: Rom1) -> CartLayout:
+    moves = sequence.with_min_items(params.min_carts)
+    bounds = [(i, i + 1) for i in range(len(moves))]
+    carts = [[ss] for ss in moves]
+    if params.add_stop_move:
+        bounds.append((len(moves), len(moves)))
+        carts.append([0])
+    return CartLayout(moves, bounds, carts)
+
+
+def layout_rom27(sequence: Sequence, params: Rom27) -> CartLayout:
+    if params.partition == "dp":
+        padded = rom27_dp_padded(sequence, params)
+    else:
+        padded = sequence.padded(params.min_items())
+    moves = padded.ss_list
+    if params.partition == "dp":
+        bounds = rom27_dp_bounds(padded, params)
+    elif params.cut_wait_moves:
+        bounds = rom27_optimized_bounds(moves, sequence.wait_move)
+    else:
+        bounds = rom27_bounds(moves, params)
+    return CartLayout(moves, bounds, take(moves, bounds))
+
+
+def layout_rom26(sequence: Sequence, params: Rom26) -> CartLayout:
+    min_items = ((len(sequence) + 25) // 26) * 26
+    padded = sequence.padded(min_items)
+    bounds = rom26_bounds(padded.wait_mask)
+    return CartLayout(padded.ss_list, bounds, rom26_carts(padded, bounds))
+
+
+def carts_schem(
+    carts: Iterable[Minecart], origin: list[int] | None = None, gzipped: bool = True
+) -> File:
     out = Schematic.empty()
-    out.set_entities(carts)
+    out.set_entities(list(carts))
     if origin:
         out.set_origin(origin)
-    return File(out, gzipped=True)
+    return File(out, gzipped=gzipped)
 
 
 def gen_rom1(sequence: Sequence, params: Rom1) -> File:
-    ss_list = sequence.with_min_items(params.min_carts)
-    carts = encode_rom1(
+    rom = rom_carts(sequence, params)
+    return carts_schem(rom.carts, rom.origin)
+
+
+def carts_rom1(
+    sequence: Sequence, params: Rom1, serialized: bool = False
+) -> RomCarts[Minecart | bytes]:
+    with stage("partition"):
+        ss_list = sequence.with_min_items(params.min_carts)
+    encode = encode_rom1_bytes if serialized else encode_rom1
+    carts = encode(
         ss_list, cart_pos=params.cart_pos, add_stop_move=params.add_stop_move
     )
-    return carts_schem(carts)
+    return RomCarts(carts, len(ss_list) + params.add_stop_move)
 
 
 # TODO: everything below here is yet untested
 
 
 def gen_rom27(sequence: Sequence, params: Rom27) -> File:
-    ss_list = sequence.with_min_items(params.min_items())
-    if params.cut_wait_moves:
-        partitions = partition_rom27_optimized(ss_list, sequence.wait_move)
-    else:
-        partitions = partition_rom27(ss_list, params)
+    rom = rom_carts(sequence, params)
+    return carts_schem(rom.carts, rom.origin)
 
-    carts = encode_rom27(partitions, cart_pos=params.cart_pos, medium=params.medium)
-    return carts_schem(carts)
+
+def carts_rom27(
+    sequence: Sequence, params: Rom27, serialized: bool = False
+) -> RomCarts[Minecart | bytes]:
+    with stage("partition"):
+        layout = layout_rom27(sequence, params)
+        stats = rom27_stats(layout.carts, params)
+
+    encode = encode_rom27_bytes if serialized else encode_rom27
+    carts = encode(layout.carts, cart_pos=params.cart_pos, medium=params.medium)
+    return RomCarts(carts, len(layout.carts), stats=stats)
 
 
 def gen_rom26(sequence: Sequence, params: Rom26) -> File:
-    min_items = ((len(sequence.ss_list) + 25) // 26) * 26
-    ss_list = sequence.with_min_items(min_items)
-    assert sequence.wait_move is not None
-    partitions = partition_rom26(ss_list, sequence.wait_move)
+    rom = rom_carts(sequence, params)
+    return carts_schem(rom.carts, rom.origin)
 
-    carts = encode_rom27(partitions, cart_pos=params.cart_pos, medium=params.medium)
-    return carts_schem(carts, params.origin)
 
+def carts_rom26(
+    sequence: Sequence, params: Rom26, serialized: bool = False
+) -> RomCarts[Minecart | bytes]:
+    with stage("partition"):
+        layout = layout_rom26(sequence, params)
 
-def gen_rom729(sequence: Sequence, params: Rom729) -> File:
-    moves = partition_rom729(sequence, params)
-    carts = encode_rom729(moves, cart_pos=params.cart_pos)
-    return carts_schem(carts)
+    encode = encode_rom27_bytes if serialized else encode_rom27
+    carts = encode(layout.carts, cart_pos=params.cart_pos, medium=params.medium)
+    return RomCarts(carts, len(layout.carts), params.origin)
 
 
-def partition_rom27(ss_list: list[int], params: Rom27) -> list[list[int]]:
-    queue = deque(ss_list)
-    result = []
-    min_items = params.min_items()
-
-    while queue:
-        if not result or len(result[-1]) == 27 or len(queue) <= min_items:
-            result.append([])
-            min_items -= params.min_items_per_cart
-        else:
-            result[-1].append(queue.popleft())
-    return result
+def gen_rom729(sequence: Sequence, params: Rom729) -> File:
+    rom = rom_carts(sequence, params)
+    return carts_schem(rom.carts, rom.origin)
 
 
-def split_list[T](inp: list[T], split_on: T) -> list[list[T]]:
-    if not inp:
-        return []
+def carts_rom729(
+    sequence: Sequence, params: Rom729, serialized: bool = False
+) -> RomCarts[Minecart | bytes]:
+    with stage("partition"):
+        moves = partition_rom729(sequence, params)
+    encode = encode_rom729_bytes if serialized else encode_rom729
+    carts = encode(moves, cart_pos=params.cart_pos)
+    return RomCarts(carts, len(moves))
 
-    result = [[]]
 
-    for item in inp:
-        if item == split_on:
-            result.append([])
-        else:
-            result[-1].append(item)
+def partition_rom27(ss_list: list[int], params: Rom27) -> list[list[int]]:
+    return take(ss_list, rom27_bounds(ss_list, params))
 
-    return result
+
+def rom27_bounds(ss_list: list[int], params: Rom27) -> Bounds:
+    sizes = reserved_sizes(
+        len(ss_list), 27, params.min_items(), params.min_items_per_cart
+    )
+    return sizes_to_bounds(sizes)
 
 
 def partition_rom27_optimized(
@@ -100,102 +266,104 @@ def partition_rom27_optimized(
     max_cart_len: int = 27,
     min_items_per_cart: int = 3,
 ) -> list[list[int]]:
+    bounds = rom27_optimized_bounds(
+        ss_list, wait_move, max_cart_len, min_items_per_cart
+    )
+    return take(ss_list, bounds)
+
+
+def rom27_optimized_bounds(
+    ss_list: list[int],
+    wait_move: int | None,
+    max_cart_len: int = 27,
+    min_items_per_cart: int = 3,
+) -> Bounds:
     if wait_move is None:
         raise ValueError("Wait move must be supplied for optimized rom")
 
     # assumes you have enough moves to fill min cart count
     assert ss_list[-1] != wait_move, "Last move cannot be a wait move"
 
-    result = []
-    segments = deque(split_list(ss_list, wait_move))
-    queue = segments.popleft()
-
-    # TODO: this can probably be optimized more
-
-    while segments or queue:
-        if len(queue) < max_cart_len:
-            # entire queue can fit into one cart
-
-            # pack as many extra wait moves as we can
-            while len(queue) < max_cart_len and segments and segments[0] == []:
-                queue.append(wait_move)
-                segments.popleft()
-
-            if len(queue) > min_items_per_cart:
-                result.append(queue)
-            else:
-                # need to add more items
-                queue.append(wait_move)
-                queue += segments.popleft()
-        elif len(queue) < max_cart_len + min_items_per_cart:
-            # in the case(s) that subtracting 27 wouldn't leave enough items in next cart to cover minimum
-            split_pos = len(queue) // 2
-            result.append(queue[:split_pos])
-            queue = queue[split_pos:]
-        else:
-            # safe to pop 27 from queue
-            result.append(queue[:max_cart_len])
-            queue = queue[max_cart_len:]
-        if not queue and segments:
-            if not segments[0]:
-                queue.append(wait_move)
-            queue += segments.popleft()
+    wait_positions = np.flatnonzero(np.asarray(ss_list) == wait_move).tolist()
+    return cut_wait_bounds(
+        wait_positions, len(ss_list), max_cart_len, min_items_per_cart
+    )
 
-    return result
 
+def partition_rom27_dp(sequence: Sequence, params: Rom27) -> list[list[int]]:
+    """
+    Split the sequence into carts with the lowest estimated read time, using `cart_split_dp`.
 
-def partition_rom26(ss_list: list[int], wait_move: int) -> list[list[int]]:
-    result = []
-    i = 0
-    while i < len(ss_list):
-        result.append([wait_move] + ss_list[i : i + 26])
-        i += 26
-        if i + 26 <= len(ss_list) and all(
-            ss_list[j] == wait_move for j in range(i, i + 26)
-        ):
-            pass
-        else:
-            while i < len(ss_list) and ss_list[i] == wait_move:
-                i += 1
-    while len(result[-1]) < 27:
-        result[-1].append(wait_move)
-    return result
+    With `cut_wait_moves`, a wait move right after a cart can be dropped, since starting
+    the next cart takes its place.
+    """
+    return take(sequence.ss_list, rom27_dp_bounds(sequence, params))
 
 
-def partition_rom729(sequence: Sequence, params: Rom729) -> list[list[list[int]]]:
-    """
-    This code works in 95% of use cases, but fails with min_items_per_cart < 27 and less than full minimum carts (min carts * 729)
-    due to crappy spaghetti logic used below. I will be reworking this algo to be less shit, but don't expect it to be in the final
-    version any time soon. It works for literally everything else, so deal with it. Have you just tried making your sequence longer?
-    """
+def rom27_dp_padded(sequence: Sequence, params: Rom27) -> Sequence:
+    """The sequence padded with enough wait moves to fill `min_carts` non-empty carts."""
+    return sequence.padded(params.min_carts * max(params.min_items_per_cart, 1))
+
 
-    min_remaining_items = (
-        params.min_carts * params.min_shulkers_per_cart * params.min_discs_per_shulker
+def rom27_dp_bounds(sequence: Sequence, params: Rom27) -> Bounds:
+    if params.cut_wait_moves:
+        is_wait = sequence.wait_mask.tolist()
+    else:
+        is_wait = [False] * len(sequence)
+
+    # carts can't be empty, even if they only cut a wait move
+    min_items = max(params.min_items_per_cart, 1)
+    sizes = cart_split_dp(
+        is_wait, min_items, 27, params.dp_m, params.dp_b, params.min_carts
     )
-    min_remaining_shulkers = params.min_carts * params.min_shulkers_per_cart
-
-    queue = deque(sequence.with_min_items(min_remaining_items))
-    carts: list[list[list[int]]] = [[[]]]
-    min_remaining_items -= params.min_discs_per_shulker
-    min_remaining_shulkers -= params.min_shulkers_per_cart
-
-    while queue:
-        if (
-            len(carts[-1][-1]) < 27
-            and len(queue) > min_remaining_items
-            and len(queue) / params.min_discs_per_shulker >= min_remaining_shulkers
-        ):
-            carts[-1][-1].append(queue.popleft())
-        else:
-            # new box
-            if (
-                len(carts[-1]) == 27
-                or len(queue) // params.min_discs_per_shulker <= min_remaining_shulkers
-            ):
-                # new cart
-                carts.append([])
-                min_remaining_shulkers -= params.min_shulkers_per_cart
-            carts[-1].append([])
-            min_remaining_items -= params.min_discs_per_shulker
+    if len(sequence) and not sizes:
+        raise ValueError(
+            f"No way to split {len(sequence)} moves into {params.min_carts} or more"
+            f" carts of {min_items} to 27 items."
+        )
+    return split_sizes_to_bounds(sizes)
+
+
+def rom27_stats(partitions: list[list[int]], params: Rom27) -> dict[str, float]:
+    if params.partition != "dp":
+        return {}
+    return {
+        "estimated_read_time": estimate_read_time(partitions, params.dp_m, params.dp_b)
+    }
+
 
+def estimate_read_time(partitions: list[list[int]], m: float, b: float) -> float:
+    """Read time of a cart27 ROM under the `cart_split_dp` cost model."""
+    return sum((m + 1) * len(cart) + b for cart in partitions)
+
+
+def partition_rom26(sequence: Sequence) -> list[list[int]]:
+    return rom26_carts(sequence, rom26_bounds(sequence.wait_mask))
+
+
+def rom26_carts(sequence: Sequence, bounds: Bounds) -> list[list[int]]:
+    """Each cart starts with a wait move, and the last one is filled up with them."""
+    wait_move = sequence.wait_move
+    assert wait_move is not None
+
+    result = [[wait_move] + cart for cart in take(sequence.ss_list, bounds)]
+    result[-1] += [wait_move] * (27 - len(result[-1]))
+    return result
+
+
+def partition_rom729(sequence: Sequence, params: Rom729) -> list[list[list[int]]]:
+    sizes = rom729_sizes(
+        len(sequence),
+        params.min_carts,
+        params.min_shulkers_per_cart,
+        params.min_discs_per_shulker,
+    )
+    ss_list = sequence.with_min_items(sum(map(sum, sizes)))
+
+    carts = []
+    start = 0
+    for shulker_sizes in sizes:
+        bounds = sizes_to_bounds(shulker_sizes, start)
+        carts.append(take(ss_list, bounds))
+        start = bounds[-1][1]
     return carts
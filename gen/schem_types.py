@@ -40,7 +40,7 @@ class ShulkerItem(CompoundSchema):
 
 
 class CartItem(CompoundSchema):
-    schema = {"Count": Byte, "Slot": Byte, "id": String, "components": List[Compound]}
+    schema = {"Count": Byte, "Slot": Byte, "id": String, "components": Compound}
 
     def __init__(self, count: int, name: str, slot: int):
         super().__init__(
@@ -0,0 +1,86 @@
+"""
+Compact binary sequence format.
+
+A `.seqbin` file is a fixed header followed by the sequence's signal strengths, packed
+two moves per byte (high nibble first):
+
+    magic      4s   b"SEQB"
+    version    B
+    wait move  B    signal strength of the wait move, 0xFF if the key has none
+    reserved   H
+    key hash   32s  sha256 of the key the sequence was encoded with
+    length     I    number of moves
+"""
+
+import hashlib
+import mmap
+import struct
+from typing import Iterable
+
+import numpy as np
+from numpy.typing import NDArray
+
+MAGIC = b"SEQB"
+VERSION = 1
+NO_WAIT_MOVE = 0xFF
+HEADER = struct.Struct(">4sBBH32sI")
+
+
+def key_hash(key: dict[str, int]) -> bytes:
+    """Hash of a parsed key, independent of line order and name case in key.txt."""
+    lines = sorted(f"{ss} {name}" for name, ss in key.items())
+    return hashlib.sha256("\n".join(lines).encode("utf-8")).digest()
+
+
+def is_seqbin(data: bytes | mmap.mmap) -> bool:
+    return data[: len(MAGIC)] == MAGIC
+
+
+def pack_sequence(ss: NDArray[np.uint8], key: dict[str, int]) -> bytes:
+    ss = np.asarray(ss, dtype=np.uint8)
+    if ss.size and ss.max() > 0xF:
+        raise ValueError("Signal strengths must fit in 4 bits.")
+    wait_move = key.get("wait", NO_WAIT_MOVE)
+    header = HEADER.pack(MAGIC, VERSION, wait_move, 0, key_hash(key), len(ss))
+
+    padded = ss if len(ss) % 2 == 0 else np.append(ss, np.uint8(0))
+    packed = (padded[0::2] << 4) | padded[1::2]
+    return header + packed.tobytes()
+
+
+def unpack_sequence(
+    data: bytes | mmap.mmap, key: dict[str, int] | None = None
+) -> tuple[NDArray[np.uint8], int | None]:
+    """
+    Unpack the signal strengths and wait move of a `.seqbin` buffer.
+
+    If `key` is given, the sequence must have been encoded with that same key.
+    """
+    magic, version, wait_move, _, digest, length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a version 1 .seqbin file.")
+    if key is not None and digest != key_hash(key):
+        raise ValueError(".seqbin was encoded with a different key.")
+
+    packed = np.frombuffer(
+        data, dtype=np.uint8, count=(length + 1) // 2, offset=HEADER.size
+    )
+    ss = np.empty(len(packed) * 2, dtype=np.uint8)
+    ss[0::2] = packed >> 4
+    ss[1::2] = packed & 0xF
+    return ss[:length], None if wait_move == NO_WAIT_MOVE else wait_move
+
+
+def write_seqbin(path: str, moves: Iterable[object], key: dict[str, int]):
+    """
+    Encode moves with `key` and write them as a `.seqbin` file. Moves are looked up by
+    their `str`, so door generators can pass their own move types.
+    """
+    ss = np.array([key[str(move).lower()] for move in moves], dtype=np.uint8)
+    with open(path, "wb") as f:
+        f.write(pack_sequence(ss, key))
+
+
+def map_file(path: str) -> mmap.mmap:
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
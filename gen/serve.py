@@ -0,0 +1,240 @@
+"""
+Local build server, so tools can generate ROMs without starting Python for each one.
+
+Clients connect over TCP or a unix socket and send requests as length-prefixed frames:
+a 4 byte big-endian length, then that many bytes. A request is a JSON object with
+either
+
+    {"door": "<name in door_meta>"}
+    {"key": "<key.txt contents>", "sequence": "<one move name per line>"}
+    {"ss": [<signal strengths>], "wait_move": <ss of the wait move, optional>}
+
+plus optional "params" (RomParams as a JSON object, required unless a door is given)
+and "compression" ({"level": 1-9, "gzipped": bool}). Each request is answered with two
+frames: a JSON header, {"ok": true, "cached": bool, "carts": ...} or
+{"ok": false, "error": "..."}, then the schematic file contents, empty on errors. A
+connection can send any number of requests.
+
+Builds run on a process pool. Results are cached by a hash of their inputs, and
+identical requests arriving while one is building wait for it instead of building again.
+"""
+
+import asyncio
+import io
+import json
+import os
+import socket
+import struct
+import traceback
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any
+
+from gen.build import find_doors, resolve_info_dir
+from gen.compress import Compression
+from gen.manifest import generator_version, hash_bytes, input_hashes
+
+LENGTH = struct.Struct(">I")
+
+type Response = tuple[dict[str, Any], bytes]
+
+
+class RequestError(ValueError):
+    """A request that can't be built, reported back to the client."""
+
+
+def check_request(request: Any) -> dict:
+    if not isinstance(request, dict):
+        raise RequestError("Request must be a JSON object.")
+    sources = [name for name in ("door", "sequence", "ss") if name in request]
+    if len(sources) != 1:
+        raise RequestError('Request needs exactly one of "door", "sequence" or "ss".')
+    if "door" in request:
+        if request["door"] not in find_doors():
+            raise RequestError(f"Unknown door {request['door']!r}.")
+    elif "params" not in request:
+        raise RequestError('Requests without a door need "params".')
+    if "sequence" in request and "key" not in request:
+        raise RequestError('Text sequences need a "key".')
+    compression = request.get("compression", {})
+    if not isinstance(compression, dict) or set(compression) - {"level", "gzipped"}:
+        raise RequestError('"compression" only takes "level" and "gzipped".')
+    return request
+
+
+def request_hash(request: dict) -> str:
+    """Hash of everything a request's schematic depends on."""
+    inputs = {name: value for name, value in request.items() if name != "door"}
+    if "door" in request:
+        # door files can change between requests, so hash their contents
+        inputs["door"] = input_hashes(resolve_info_dir(request["door"]))
+    else:
+        inputs["generator_version"] = generator_version()
+    return hash_bytes(json.dumps(inputs, sort_keys=True).encode())
+
+
+def build_request(request: dict) -> Response:
+    """Build the schematic for a checked request. Runs on the worker pool."""
+    from pydantic import ValidationError
+
+    from gen.params import Sequence, parse_params, parse_sequence, read_door
+    from gen.rom_gen import write_rom
+
+    try:
+        if "door" in request:
+            sequence, params = read_door(resolve_info_dir(request["door"]))
+            # given params override the door's
+            if "params" in request:
+                params = parse_params(json.dumps(request["params"]))
+        else:
+            # check_request makes sure requests without a door have params
+            params = parse_params(json.dumps(request["params"]))
+            if "sequence" in request:
+                sequence = parse_sequence(request["key"], request["sequence"])
+            else:
+                sequence = Sequence(request["ss"], request.get("wait_move"))
+
+        compression = Compression(**request.get("compression", {}))
+        out = io.BytesIO()
+        stats = write_rom(sequence, params, out, compression)
+    except (ValidationError, ValueError, KeyError, TypeError) as e:
+        # only the message is sent back to the server process
+        raise RequestError(f"{type(e).__name__}: {e}") from None
+    return stats, out.getvalue()
+
+
+class RomServer:
+    def __init__(
+        self,
+        jobs: int | None = None,
+        cache_size: int = 32,
+        executor: Executor | None = None,
+    ):
+        if executor is None:
+            from concurrent.futures import ProcessPoolExecutor
+
+            executor = ProcessPoolExecutor(jobs)
+        self.executor = executor
+        self.cache_size = cache_size
+        self.cache: OrderedDict[str, Response] = OrderedDict()
+        self._building: dict[str, asyncio.Future[Response]] = {}
+        self.builds = 0
+
+    async def handle(self, request: Any) -> Response:
+        """Build or look up the response to a request, without raising on bad requests."""
+        loop = asyncio.get_running_loop()
+        try:
+            request = check_request(request)
+            digest = await loop.run_in_executor(None, request_hash, request)
+            header, rom_bytes = await self._build(digest, request)
+        except RequestError as e:
+            return {"ok": False, "error": str(e)}, b""
+        except Exception as e:
+            # keep serving other requests if a build crashes
+            traceback.print_exc()
+            return {
+                "ok": False,
+                "error": f"Internal error: {type(e).__name__}: {e}",
+            }, b""
+        return {"ok": True, **header}, rom_bytes
+
+    async def _build(self, digest: str, request: dict) -> Response:
+        if digest in self.cache:
+            self.cache.move_to_end(digest)
+            header, rom_bytes = self.cache[digest]
+            return {**header, "cached": True}, rom_bytes
+        if digest in self._building:
+            header, rom_bytes = await asyncio.shield(self._building[digest])
+            return {**header, "cached": True}, rom_bytes
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, build_request, request)
+        self._building[digest] = future
+        self.builds += 1
+        try:
+            header, rom_bytes = await future
+        finally:
+            del self._building[digest]
+        self.cache[digest] = (header, rom_bytes)
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return {**header, "cached": False}, rom_bytes
+
+    async def serve_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        try:
+            while True:
+                try:
+                    (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+                    body = await reader.readexactly(length)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    request = json.loads(body)
+                except ValueError:
+                    header, rom_bytes = {"ok": False, "error": "Invalid JSON."}, b""
+                else:
+                    header, rom_bytes = await self.handle(request)
+                write_frame(writer, json.dumps(header).encode())
+                write_frame(writer, rom_bytes)
+                await writer.drain()
+        except ConnectionError:
+            # the client went away before its response was sent
+            pass
+        finally:
+            writer.close()
+
+    async def start(
+        self, host: str = "127.0.0.1", port: int = 0, unix_path: str | None = None
+    ) -> asyncio.Server:
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.serve_client, unix_path)
+        return await asyncio.start_server(self.serve_client, host, port)
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+
+def write_frame(writer, data: bytes):
+    writer.write(LENGTH.pack(len(data)))
+    writer.write(data)
+
+
+def _read_exactly(sock: socket.socket, size: int) -> bytes:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Server closed the connection.")
+        data += chunk
+    return bytes(data)
+
+
+def read_frame(sock: socket.socket) -> bytes:
+    """Read one length-prefixed frame from a socket."""
+    (length,) = LENGTH.unpack(_read_exactly(sock, LENGTH.size))
+    return _read_exactly(sock, length)
+
+
+def request_rom(sock: socket.socket, request: dict) -> Response:
+    """Send a request over a connected socket and wait for its response."""
+    body = json.dumps(request).encode()
+    sock.sendall(LENGTH.pack(len(body)) + body)
+    header = json.loads(read_frame(sock))
+    return header, read_frame(sock)
+
+
+async def serve(
+    host: str, port: int, unix_path: str | None, jobs: int | None, cache_size: int
+):
+    server = RomServer(jobs, cache_size)
+    try:
+        async with await server.start(host, port, unix_path) as listener:
+            for address in [sock.getsockname() for sock in listener.sockets]:
+                print("Serving on", address, flush=True)
+            await listener.serve_forever()
+    finally:
+        server.close()
+        if unix_path is not None and os.path.exists(unix_path):
+            os.remove(unix_path)
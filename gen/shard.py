@@ -0,0 +1,204 @@
+"""
+Sharded ROMs, split over several schematics so pasting one doesn't spawn every cart at
+once.
+
+The carts are encoded once and split in order, by a number of shards, carts per shard
+or bytes per shard. Every cart is a single entity, so carts per shard also caps the
+entities pasted at a time. Carts are streamed into one shard after another, at
+{out_path without .schem}.{i}.schem, so at most one shard's carts are held in memory, and
+only for byte limits. {out_path without .schem}.shards.json lists the shards in paste
+order.
+"""
+
+import json
+import os
+import re
+from itertools import islice
+from os import path
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Iterable,
+    Iterator,
+    Literal,
+    NamedTuple,
+    TypeVar,
+)
+
+from gen.compress import Compression
+
+# the CLI parses shard limits before deciding to build anything, so like gen.build this
+# only imports numpy, pydantic and nbtlib once a ROM is generated
+if TYPE_CHECKING:
+    from gen.chunking import Bounds
+    from gen.params import RomParams, Sequence
+
+INDEX_SUFFIX = ".shards.json"
+LIMIT_KINDS = ("shards", "carts", "bytes")
+SIZE_UNITS = {"": 1, "k": 2**10, "m": 2**20, "g": 2**30}
+
+T = TypeVar("T")
+
+
+class Sharding(NamedTuple):
+    # "shards": split into `limit` shards of about the same size
+    # "carts": at most `limit` carts per shard
+    # "bytes": at most `limit` bytes of uncompressed cart NBT per shard
+    kind: Literal["shards", "carts", "bytes"]
+    limit: int
+    # how far each shard's origin is from the one before it
+    origin_offset: tuple[int, int, int] = (0, 0, 0)
+
+
+def parse_sharding(
+    spec: str, origin_offset: tuple[int, int, int] = (0, 0, 0)
+) -> Sharding:
+    """Parse "N", "carts:N" or "bytes:N", where N can end in k, M or G for bytes."""
+    kind, _, value = spec.rpartition(":")
+    kind = kind or "shards"
+    match = re.fullmatch(r"(\d+)([kmg]?)b?", value.strip().lower())
+    if kind not in LIMIT_KINDS or not match:
+        raise ValueError(f"Invalid shard limit {spec!r}, use N, carts:N or bytes:N.")
+    if match[2] and kind != "bytes":
+        raise ValueError(f"Only byte limits take a unit, got {spec!r}.")
+
+    limit = int(match[1]) * SIZE_UNITS[match[2]]
+    if limit < 1:
+        raise ValueError(f"Shard limit must be at least 1, got {spec!r}.")
+    return Sharding(kind, limit, origin_offset)
+
+
+def count_bounds(num_carts: int, sharding: Sharding) -> "Bounds":
+    """Consecutive ranges of carts for each shard of a count based `sharding`."""
+    from gen.chunking import sizes_to_bounds
+
+    kind, limit, _ = sharding
+    if kind == "shards":
+        num_shards = max(min(limit, num_carts), 1)
+        per_shard, extra = divmod(num_carts, num_shards)
+        sizes = [per_shard + 1] * extra + [per_shard] * (num_shards - extra)
+        return sizes_to_bounds(sizes)
+
+    full, rest = divmod(num_carts, limit)
+    return sizes_to_bounds([limit] * full + ([rest] if rest else []))
+
+
+def byte_shards(
+    items: Iterable[T], limit: int, size: Callable[[T], int] = len
+) -> Iterator[list[T]]:
+    """Split `items` in order into runs of at most `limit` bytes, always yielding one."""
+    # an item bigger than the limit still gets a shard of its own
+    shard, shard_bytes = [], 0
+    for item in items:
+        if shard and shard_bytes + size(item) > limit:
+            yield shard
+            shard, shard_bytes = [], 0
+        shard.append(item)
+        shard_bytes += size(item)
+    yield shard
+
+
+def shard_bounds(cart_sizes: list[int], sharding: Sharding) -> "Bounds":
+    """Consecutive ranges of carts for each shard, given the size of each cart in bytes."""
+    from gen.chunking import sizes_to_bounds
+
+    if sharding.kind != "bytes":
+        return count_bounds(len(cart_sizes), sharding)
+    shards = byte_shards(cart_sizes, sharding.limit, size=int)
+    return sizes_to_bounds(len(shard) for shard in shards)
+
+
+def split_carts(
+    carts: Iterable[bytes], num_carts: int, sharding: Sharding
+) -> Iterator[tuple[int, Iterable[bytes]]]:
+    """
+    The number of carts in each shard and an iterable of them, in order.
+
+    Each shard's carts must be consumed before asking for the next shard.
+    """
+    if sharding.kind == "bytes":
+        for shard in byte_shards(carts, sharding.limit):
+            yield len(shard), shard
+        return
+
+    carts = iter(carts)
+    for start, stop in count_bounds(num_carts, sharding):
+        yield stop - start, islice(carts, stop - start)
+
+
+def index_path(out_path: str) -> str:
+    return path.splitext(out_path)[0] + INDEX_SUFFIX
+
+
+def shard_path(out_path: str, shard: int) -> str:
+    return f"{path.splitext(out_path)[0]}.{shard}.schem"
+
+
+def shard_origin(
+    origin: list[int] | None, offset: tuple[int, int, int], shard: int
+) -> list[int] | None:
+    """Origin of a shard, `offset` further along than the shard before it."""
+    if not any(offset):
+        return origin
+    return [base + shard * step for base, step in zip(origin or [0, 0, 0], offset)]
+
+
+def remove_stale_shards(out_path: str, paths: list[str]):
+    """Remove shards of the last build of `out_path` that aren't in `paths`."""
+    try:
+        with open(index_path(out_path)) as f:
+            old_index = json.load(f)
+    except FileNotFoundError:
+        return
+    directory = path.dirname(out_path)
+    for shard in old_index["shards"]:
+        old_path = path.join(directory, shard["file"])
+        if old_path not in paths and path.isfile(old_path):
+            os.remove(old_path)
+
+
+def save_sharded_rom(
+    sequence: "Sequence",
+    params: "RomParams",
+    out_path: str,
+    sharding: Sharding,
+    compression: Compression = Compression(),
+) -> dict:
+    """
+    Generate a ROM and write it as shards next to `out_path`, with an index file.
+
+    Returns stats about the ROM, with the paths of the shards in paste order.
+    """
+    from gen.nbt_stream import save_schem
+    from gen.rom_gen import rom_carts
+
+    rom = rom_carts(sequence, params, serialized=True)
+    paths, bounds, origins = [], [], []
+    start = 0
+    for i, (num_carts, carts) in enumerate(
+        split_carts(rom.carts, rom.num_carts, sharding)
+    ):
+        paths.append(shard_path(out_path, i))
+        bounds.append((start, start + num_carts))
+        origins.append(shard_origin(rom.origin, sharding.origin_offset, i))
+        save_schem(paths[i], carts, num_carts, origins[i], compression)
+        start += num_carts
+
+    remove_stale_shards(out_path, paths)
+    index = {
+        "carts": start,
+        "shards": [
+            {
+                "file": path.basename(shard),
+                "carts": [start, stop],
+                "origin": origin,
+            }
+            for shard, (start, stop), origin in zip(paths, bounds, origins)
+        ],
+    }
+    tmp_path = index_path(out_path) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=2)
+    os.replace(tmp_path, index_path(out_path))
+
+    return {"carts": index["carts"], **(rom.stats or {}), "shards": paths}
@@ -0,0 +1,34 @@
+from gen.bench import compare_results, run_suite, synthetic_sequence
+
+
+def test_synthetic_sequence():
+    sequence = synthetic_sequence(1000)
+    assert len(sequence) == 1000
+    assert not sequence.wait_mask[-4:].any()
+    assert 200 < sequence.wait_mask.sum() < 500
+    assert synthetic_sequence(1000).ss_list == sequence.ss_list
+
+
+def test_run_suite():
+    results = run_suite(["1k"], [], repeat=1)["results"]
+    assert "partition_rom27_dp/1k" in results
+    assert "File.save/1k" in results
+    for key, result in results.items():
+        assert "error" not in result, key
+        assert result["seconds"] > 0
+
+
+def test_compare_results():
+    old = {"results": {"a": {"seconds": 1.0, "peak_bytes": 100}, "b": {"error": "x"}}}
+    new = {
+        "results": {
+            "a": {"seconds": 1.5, "peak_bytes": 110},
+            "b": {"seconds": 1.0, "peak_bytes": 100},
+            "c": {"seconds": 1.0, "peak_bytes": 100},
+        }
+    }
+    assert compare_results(old, new, 0.2) == [("a", "seconds", 1.0, 1.5)]
+    assert compare_results(old, new, 0.05) == [
+        ("a", "seconds", 1.0, 1.5),
+        ("a", "peak_bytes", 100, 110),
+    ]
@@ -0,0 +1,45 @@
+import os
+
+import gen.build
+from gen.build import BuildResult, build_doors
+
+
+def crash(door: str, *args):
+    os._exit(1)
+
+
+def test_build_doors_reports_crashed_workers(monkeypatch):
+    monkeypatch.setattr(gen.build, "build_door", crash)
+    results = build_doors(["a", "b"], jobs=1)
+    assert [result.door for result in results] == ["a", "b"]
+    assert all(
+        result.error is not None and "BrokenProcessPool" in result.error
+        for result in results
+    )
+
+
+def fail_generator(module: str):
+    if module == "bad":
+        raise RuntimeError("generator failed")
+
+
+def fake_build(door: str, *args):
+    return BuildResult(door, f"{door}.schem", 0.0)
+
+
+def test_build_doors_reports_failed_generators(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(gen.build, "DOOR_GENERATORS", {"a": "bad", "b": "good"})
+    monkeypatch.setattr(
+        gen.build, "stale_generators", lambda doors: {"bad": "1", "good": "2"}
+    )
+    monkeypatch.setattr(
+        gen.build, "record_generator", lambda *args: recorded.append(args)
+    )
+    monkeypatch.setattr(gen.build, "run_generator", fail_generator)
+    monkeypatch.setattr(gen.build, "build_door", fake_build)
+
+    a, b = build_doors(["a", "b"], jobs=1, incremental=True)
+    assert a.error is not None and "generator failed" in a.error
+    assert b.error is None and b.out_path == "b.schem"
+    assert recorded == [("good", "2")]
@@ -1,5 +1,12 @@
+import random
+
 import pytest
-from gen.cart_split_dp import cart_split_dp
+from gen.cart_split_dp import (
+    cart_split_dp,
+    cart_split_dp_batch,
+    cart_split_dp_sweep,
+    param_grid,
+)
 
 
 @pytest.mark.parametrize(
@@ -19,6 +26,9 @@ from gen.cart_split_dp import cart_split_dp
         ([False], 1, 2, 0, 1, [1]),
         # Single wait, 0-size cart allowed
         ([True], 0, 2, 0, 1, [-1]),
+        # 0-size carts allowed, longer than one cart
+        ([False] * 5, 0, 2, 0, 1, [2, 2, 1]),
+        ([False, False, True, True, False], 0, 2, 0, 1, [-3, -1, 1]),
         # Single wait, 0-size cart not allowed
         ([True], 1, 2, 0, 1, [1]),
         # Alternating pattern
@@ -45,3 +55,42 @@ def test_cart_split_dp(is_wait, min_k, max_k, m, b, expected_cart_sizes):
     for cart_size in result:
         cart_size = cart_size if cart_size > 0 else -cart_size - 1
         assert min_k <= cart_size <= max_k
+
+
+@pytest.mark.parametrize(
+    "is_wait,min_k,min_carts,expected_cart_sizes",
+    [
+        # one cart would be cheapest
+        ([False] * 6, 1, 3, [4, 1, 1]),
+        ([False] * 7, 2, 3, [3, 2, 2]),
+        # carts cutting waits count too
+        ([False, True, False, False, True, False], 1, 2, [-5, 1]),
+        # not enough items
+        ([False] * 5, 2, 3, []),
+    ],
+)
+def test_cart_split_dp_min_carts(is_wait, min_k, min_carts, expected_cart_sizes):
+    result = cart_split_dp(is_wait, min_k, 27, 0, 1, min_carts)
+    assert result == expected_cart_sizes
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_cart_split_dp_batch(seed):
+    rng = random.Random(seed)
+    is_wait = [rng.random() < 0.4 for _ in range(rng.randint(0, 200))]
+    grid = param_grid([0, 1, 3, 6], [2, 5, 27], [0, 0.5], [0, 1, 4.5])
+
+    for split in cart_split_dp_batch(is_wait, grid):
+        assert split.cart_sizes == cart_split_dp(is_wait, *split.params)
+        if split.cart_sizes:
+            min_k, max_k, m, b = split.params
+            items = [k if k > 0 else -k - 1 for k in split.cart_sizes]
+            assert split.cost == pytest.approx(sum((m + 1) * k + b for k in items))
+
+
+def test_cart_split_dp_sweep():
+    is_wait = [i % 5 == 0 for i in range(100)]
+    grid = param_grid(range(10), [27], [0, 1], [1, 2])
+    assert cart_split_dp_sweep(is_wait, grid, jobs=2, chunk_size=8) == (
+        cart_split_dp_batch(is_wait, grid)
+    )
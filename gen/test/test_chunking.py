@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from gen.chunking import (
+    cut_wait_bounds,
+    front_loaded,
+    reserved_sizes,
+    rom26_bounds,
+    rom729_sizes,
+    sizes_to_bounds,
+    take,
+)
+
+
+def test_take():
+    items = list(range(10))
+    assert take(items, sizes_to_bounds([3, 0, 7])) == [[0, 1, 2], [], items[3:]]
+
+
+def test_reserved_sizes():
+    assert reserved_sizes(60, 27, 0, 0) == [27, 27, 6]
+    # 3 carts of at least 10 items
+    assert reserved_sizes(40, 27, 30, 10) == [20, 10, 10]
+    assert reserved_sizes(0, 27, 30, 10) == []
+
+
+def test_rom26_bounds():
+    wait_mask = np.array([False] * 27 + [True] * 3 + [False] * 10 + [True] * 30)
+    # trailing waits that don't fill a cart are dropped
+    assert rom26_bounds(wait_mask) == [(0, 26), (26, 52)]
+
+    # waits only fill a cart when there are enough of them
+    wait_mask = np.array([False] * 26 + [True] * 3 + [False] * 10)
+    assert rom26_bounds(wait_mask) == [(0, 26), (29, 39)]
+
+
+def test_cut_wait_bounds():
+    # 10 items, wait, 30 items, wait, wait, 5 items
+    bounds = cut_wait_bounds([10, 41, 42], 48, 27, 3)
+    assert bounds == [(0, 10), (11, 38), (38, 42), (43, 48)]
+
+    # too few items in the first segment, so the wait is kept
+    assert cut_wait_bounds([2], 10, 27, 3) == [(0, 10)]
+
+    with pytest.raises(ValueError):
+        cut_wait_bounds([10], 13, 27, 3)
+
+
+def test_front_loaded():
+    assert front_loaded(57, 4, 3, 27) == [27, 24, 3, 3]
+    assert front_loaded(54, 2, 27, 27) == [27, 27]
+    with pytest.raises(ValueError):
+        front_loaded(60, 2, 3, 27)
+
+
+def test_rom729_sizes():
+    assert rom729_sizes(60, 1, 1, 1) == [[27, 27, 6]]
+    assert rom729_sizes(6, 2, 3, 1) == [[1, 1, 1], [1, 1, 1]]
+    assert rom729_sizes(100, 2, 5, 3) == [[27, 27, 25, 3, 3], [3, 3, 3, 3, 3]]
+    # minimums of 0 still put an item in every cart and shulker
+    assert rom729_sizes(100, 3, 0, 0) == [[27, 27], [27], [19]]
+    # 28 discs can't be split into full shulkers, so it's padded
+    assert rom729_sizes(28, 1, 1, 27) == [[27, 27]]
+    assert sum(map(sum, rom729_sizes(10**6, 1, 0, 0))) == 10**6
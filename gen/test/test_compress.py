@@ -0,0 +1,47 @@
+import gzip
+import io
+import random
+import zlib
+
+import nbtlib
+import pytest
+
+from gen.compress import Compression, ParallelGzipWriter
+from gen.params import Sequence, parse_params
+from gen.rom_gen import save_rom
+
+
+def single_stream(compressed: bytes) -> bytes:
+    """Decompress a gzip stream, checking it is a single member."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    data = decompressor.decompress(compressed)
+    assert decompressor.eof and not decompressor.unused_data
+    return data
+
+
+@pytest.mark.parametrize("size", [0, 10, 1000, 5000, 100_000])
+def test_parallel_gzip(size):
+    rng = random.Random(size)
+    data = bytes(rng.choice(b"abcabd\x00\x01") for _ in range(size))
+    out = io.BytesIO()
+    with ParallelGzipWriter(out, level=6, threads=3, block_size=1024) as writer:
+        for start in range(0, size, 333):
+            writer.write(data[start : start + 333])
+    assert single_stream(out.getvalue()) == data
+
+
+@pytest.mark.parametrize(
+    "compression",
+    [Compression(level=1), Compression(gzipped=False), Compression(threads=4)],
+)
+def test_save_rom_compression(tmp_path, compression):
+    sequence = Sequence([5, 1, 1, 12, 3, 1, 15] * 200, wait_move=1)
+    params = parse_params('{"rom_type": "cart27", "medium": "shulker"}')
+    save_rom(sequence, params, str(tmp_path / "default.schem"))
+    save_rom(sequence, params, str(tmp_path / "rom.schem"), compression)
+
+    with gzip.open(tmp_path / "default.schem") as f:
+        expected = f.read()
+    data = (tmp_path / "rom.schem").read_bytes()
+    assert (single_stream(data) if compression.gzipped else data) == expected
+    nbtlib.load(tmp_path / "rom.schem", gzipped=compression.gzipped)
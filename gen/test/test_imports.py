@@ -0,0 +1,13 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ["nbtlib", "numpy", "pydantic", "gen.schem_types", "gen.encode"]
+
+
+def test_cli_import_is_lazy():
+    code = "import sys, gen.__main__; print(' '.join(sorted(sys.modules)))"
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    loaded = result.stdout.split()
+    assert not [module for module in HEAVY_MODULES if module in loaded]
@@ -0,0 +1,26 @@
+from click.testing import CliRunner
+
+import gen.__main__
+from gen.__main__ import main
+from gen.build import BuildResult
+
+
+def test_several_door_names_run_batch(monkeypatch):
+    built = []
+
+    def build_doors(doors, name, *args):
+        built.extend(doors)
+        return [BuildResult(door, f"{door}.schem", 0.0) for door in doors]
+
+    monkeypatch.setattr(gen.__main__, "known_doors", lambda: {"a", "b"})
+    monkeypatch.setattr(gen.__main__, "build_doors", build_doors)
+    result = CliRunner().invoke(main, ["a", "b"])
+    assert result.exit_code == 0, result.output
+    assert built == ["a", "b"]
+
+
+def test_build_rejects_door_name_as_out_path(monkeypatch):
+    monkeypatch.setattr(gen.__main__, "known_doors", lambda: {"a", "b"})
+    result = CliRunner().invoke(main, ["build", "a", "b"])
+    assert result.exit_code == 2
+    assert "is a door name" in result.output
@@ -0,0 +1,87 @@
+from gen.build import build_rom, build_rom_incremental
+from gen.compress import Compression
+from gen.manifest import Manifest
+from gen.shard import Sharding
+
+KEY = "1 wait\n5 a\n12 b\n"
+SEQUENCE = "a\nwait\nb\n" * 10
+
+
+def make_door(root, name: str, params: str) -> str:
+    info_dir = root / "door_meta" / name
+    info_dir.mkdir(parents=True)
+    (info_dir / "key.txt").write_text(KEY)
+    (info_dir / "sequence.txt").write_text(SEQUENCE)
+    (info_dir / "params.json").write_text(params)
+    return f"door_meta/{name}"
+
+
+def test_incremental_rebuild(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    info_dir = make_door(tmp_path, "door", '{"rom_type": "cart1"}')
+    out_path = "output_schematics/door/door.schem"
+
+    assert build_rom_incremental(info_dir, out_path) is not None
+    assert build_rom_incremental(info_dir, out_path) is None
+    assert str(tmp_path / out_path) in Manifest.load("door").data["outputs"]
+
+    # a second output of the same door is tracked separately
+    other_out = "output_schematics/door/other.schem"
+    assert build_rom_incremental(info_dir, other_out) is not None
+    assert build_rom_incremental(info_dir, out_path) is None
+
+    (tmp_path / info_dir / "params.json").write_text(
+        '{"rom_type": "cart27", "medium": "disc"}'
+    )
+    assert build_rom_incremental(info_dir, out_path) is not None
+    assert build_rom_incremental(info_dir, out_path) is None
+
+    (tmp_path / out_path).unlink()
+    assert build_rom_incremental(info_dir, out_path) is not None
+
+
+def test_incremental_compression_change(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    info_dir = make_door(tmp_path, "door", '{"rom_type": "cart1"}')
+    out_path = "output_schematics/door/door.schem"
+
+    assert build_rom_incremental(info_dir, out_path) is not None
+    plain = Compression(gzipped=False)
+    assert build_rom_incremental(info_dir, out_path, compression=plain) is not None
+    assert (tmp_path / out_path).read_bytes()[:2] != b"\x1f\x8b"
+    assert build_rom_incremental(info_dir, out_path, compression=plain) is None
+    assert build_rom_incremental(info_dir, out_path) is not None
+    assert (tmp_path / out_path).read_bytes()[:2] == b"\x1f\x8b"
+
+
+def test_incremental_sharding_change(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    info_dir = make_door(tmp_path, "door", '{"rom_type": "cart1"}')
+    out_path = "output_schematics/door/door.schem"
+
+    assert build_rom_incremental(info_dir, out_path, sharding=Sharding("shards", 2))
+    assert (
+        build_rom_incremental(info_dir, out_path, sharding=Sharding("shards", 2))
+        is None
+    )
+    stats = build_rom_incremental(info_dir, out_path, sharding=Sharding("shards", 3))
+    assert stats is not None and len(stats["shards"]) == 3
+    stats = build_rom_incremental(
+        info_dir, out_path, sharding=Sharding("shards", 3, (0, 2, 0))
+    )
+    assert stats is not None
+
+
+def test_plain_build_invalidates_manifest(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    info_dir = make_door(tmp_path, "door", '{"rom_type": "cart1"}')
+    out_path = "output_schematics/door/door.schem"
+    params = tmp_path / info_dir / "params.json"
+
+    assert build_rom_incremental(info_dir, out_path) is not None
+    params.write_text('{"rom_type": "cart27", "medium": "disc"}')
+    build_rom(info_dir, out_path)
+    # back to the recorded inputs, but the output is from the plain build
+    params.write_text('{"rom_type": "cart1"}')
+    assert build_rom_incremental(info_dir, out_path) is not None
+    assert build_rom_incremental(info_dir, out_path) is None
@@ -0,0 +1,79 @@
+import gzip
+import io
+
+import pytest
+from nbtlib import File
+
+from gen.params import Sequence, parse_params
+from gen.compress import Compression
+from gen.rom_gen import carts_schem, gen_rom_bytes, rom_carts, save_rom, write_rom
+from gen.nbt_stream import save_schem, write_schem
+
+SEQUENCE = Sequence([5, 1, 1, 12, 3, 1, 15] * 20 + [1] * 30, wait_move=1)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        '{"rom_type": "cart1"}',
+        '{"rom_type": "cart1", "add_stop_move": false, "min_carts": 300}',
+        '{"rom_type": "cart27", "medium": "disc", "min_carts": 8, "min_items_per_cart": 20}',
+        '{"rom_type": "cart27", "medium": "shulker"}',
+        '{"rom_type": "cart26", "medium": "disc", "origin": [1, 2, 3]}',
+        '{"rom_type": "cart26", "medium": "shulker"}',
+        '{"rom_type": "cart729", "min_carts": 2, "min_shulkers_per_cart": 5, "min_discs_per_shulker": 3}',
+    ],
+)
+def test_stream_matches_schematic(params, tmp_path):
+    rom_params = parse_params(params)
+
+    expected = io.BytesIO()
+    rom = rom_carts(SEQUENCE, rom_params)
+    File(carts_schem(rom.carts, rom.origin)).write(expected)
+
+    for serialized in (False, True):
+        streamed = io.BytesIO()
+        rom = rom_carts(SEQUENCE, rom_params, serialized)
+        write_schem(streamed, rom.carts, rom.num_carts, rom.origin)
+        assert streamed.getvalue() == expected.getvalue()
+
+    out_path = tmp_path / "rom.schem"
+    save_rom(SEQUENCE, rom_params, str(out_path))
+    with gzip.open(out_path, "rb") as f:
+        assert f.read() == expected.getvalue()
+
+
+def test_stream_count_mismatch():
+    rom = rom_carts(SEQUENCE, parse_params('{"rom_type": "cart1"}'))
+    with pytest.raises(ValueError):
+        write_schem(io.BytesIO(), rom.carts, rom.num_carts + 1)
+
+
+def test_rom_bytes(tmp_path):
+    rom_params = parse_params('{"rom_type": "cart27", "medium": "disc"}')
+    out_path = tmp_path / "rom.schem"
+    stats = save_rom(SEQUENCE, rom_params, str(out_path))
+    with gzip.open(out_path, "rb") as f:
+        expected = f.read()
+
+    assert gzip.decompress(gen_rom_bytes(SEQUENCE, rom_params)) == expected
+    for compression in (Compression(), Compression(gzipped=False)):
+        fileobj = io.BytesIO()
+        assert write_rom(SEQUENCE, rom_params, fileobj, compression) == stats
+        # the writer doesn't close file objects it was given
+        data = fileobj.getvalue()
+        assert (gzip.decompress(data) if compression.gzipped else data) == expected
+
+
+def test_failed_writes_keep_the_old_file(tmp_path):
+    out_path = tmp_path / "rom.schem"
+    out_path.write_bytes(b"old rom")
+
+    def carts():
+        yield from rom_carts(SEQUENCE, parse_params('{"rom_type": "cart1"}')).carts
+        raise KeyError("move")
+
+    with pytest.raises(KeyError):
+        save_schem(str(out_path), carts(), 1000)
+    assert out_path.read_bytes() == b"old rom"
+    assert [path.name for path in tmp_path.iterdir()] == ["rom.schem"]
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from gen.params import Sequence, parse_encoding, parse_sequence
+
+KEY = """
+1 wait
+3 worm
+12 B
+15
+
+"""
+
+
+def test_parse_encoding():
+    assert parse_encoding(KEY) == {"wait": 1, "worm": 3, "b": 12}
+
+
+def test_parse_sequence():
+    sequence = parse_sequence(KEY, "b\nWAIT\nworm\n\nwait\nwait\nB\n")
+    assert sequence.ss.dtype == np.uint8
+    assert sequence.ss_list == [12, 1, 3, 1, 1, 12]
+    assert sequence.wait_move == 1
+
+    with pytest.raises(KeyError):
+        parse_sequence(KEY, "b\nfold\n")
+
+
+def test_derived_views():
+    sequence = Sequence([1, 1, 5, 1, 15, 1, 1, 1], wait_move=1)
+    assert sequence.wait_mask.tolist() == [1, 1, 0, 1, 0, 1, 1, 1]
+    starts, lengths = sequence.wait_runs
+    assert starts.tolist() == [0, 3, 5]
+    assert lengths.tolist() == [2, 1, 3]
+    assert sequence.item_counts.tolist() == [1, 1, 8, 1, 27, 1, 1, 1]
+
+    no_wait = Sequence([5, 5], wait_move=None)
+    assert not no_wait.wait_mask.any()
+    assert no_wait.wait_runs[0].size == 0
+
+
+def test_padded():
+    sequence = Sequence([5, 6], wait_move=1)
+    assert sequence.padded(1) is sequence
+    assert sequence.with_min_items(4) == [5, 6, 1, 1]
+
+    with pytest.raises(ValueError):
+        Sequence([5], wait_move=None).padded(2)
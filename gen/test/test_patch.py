@@ -0,0 +1,78 @@
+import gzip
+import json
+import random
+
+import numpy as np
+import pytest
+
+from gen.params import Sequence, parse_params
+from gen.patch import changed_carts, load_state, patch_rom
+from gen.diff import Hunk, diff
+from gen.rom_gen import save_rom
+
+WAIT = 1
+PARAMS = [
+    {"rom_type": "cart1"},
+    {"rom_type": "cart27", "medium": "disc"},
+    {"rom_type": "cart27", "medium": "disc", "cut_wait_moves": True},
+    {"rom_type": "cart27", "medium": "shulker", "partition": "dp", "dp_b": 10},
+    {"rom_type": "cart26", "medium": "disc", "origin": [1, 2, 3]},
+]
+
+
+def random_moves(rng: random.Random, n: int) -> list[int]:
+    return [rng.choice([WAIT, WAIT, 3, 7, 12]) for _ in range(n)] + [3] * 5
+
+
+def edit(rng: random.Random, moves: list[int], resize: bool) -> list[int]:
+    moves = list(moves)
+    for _ in range(3):
+        pos = rng.randrange(len(moves) - 5)
+        length = rng.randint(0, 3)
+        moves[pos : pos + length] = [3] * (rng.randint(0, 3) if resize else length)
+    return moves
+
+
+def test_diff():
+    old = np.array([1, 2, 3, 4, 5, 6])
+    new = np.array([1, 3, 4, 9, 9, 6, 7])
+    assert diff(old, new) == [Hunk(1, 2, 1, 1), Hunk(4, 5, 3, 5), Hunk(6, 6, 6, 7)]
+    assert diff(old, old) == []
+
+
+def test_changed_carts():
+    old_bounds = [(0, 3), (3, 6), (6, 9), (9, 12)]
+    # two moves inserted into the second cart
+    hunks = [Hunk(4, 4, 4, 6)]
+    new_bounds = [(0, 3), (3, 8), (8, 11), (11, 14)]
+    assert changed_carts(hunks, old_bounds, new_bounds) == [1]
+    # same inserts, but the carts after it shifted
+    new_bounds = [(0, 3), (3, 6), (6, 9), (9, 12), (12, 14)]
+    assert changed_carts(hunks, old_bounds, new_bounds) == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("params", PARAMS)
+def test_patch_rom(tmp_path, params):
+    rng = random.Random(0)
+    rom_params = parse_params(json.dumps(params))
+    out_path = str(tmp_path / "rom.schem")
+    full_path = str(tmp_path / "full.schem")
+
+    moves = random_moves(rng, 300)
+    stats, changed = patch_rom(Sequence(moves, WAIT), rom_params, out_path)
+    assert changed == list(range(int(stats["carts"])))
+
+    for i in range(6):
+        # edits that change the sequence length can move every cart after them
+        resize = i % 2 == 1
+        moves = edit(rng, moves, resize)
+        sequence = Sequence(moves, WAIT)
+        stats, changed = patch_rom(sequence, rom_params, out_path)
+        if not resize:
+            assert len(changed) < stats["carts"]
+        state = load_state(out_path)
+        assert state is not None and state.sequence.ss_list == moves
+
+        save_rom(sequence, rom_params, full_path)
+        with gzip.open(out_path) as patched, gzip.open(full_path) as full:
+            assert patched.read() == full.read()
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from gen.params import Rom27, Sequence
+from gen.rom_gen import (
+    estimate_read_time,
+    layout_rom27,
+    partition_rom27,
+    partition_rom27_dp,
+)
+
+WAIT = 1
+
+
+def random_sequence(n: int, seed: int = 0) -> Sequence:
+    rng = random.Random(seed)
+    return Sequence([rng.choice([WAIT, WAIT, 3, 7, 12]) for _ in range(n)], WAIT)
+
+
+def dp_params(**kwargs) -> Rom27:
+    return Rom27(rom_type="cart27", medium="disc", partition="dp", **kwargs)
+
+
+def dropped_moves(sequence: Sequence, partitions: list[list[int]]) -> list[int]:
+    """Moves of the sequence that were cut between carts."""
+    ss = sequence.ss_list
+    dropped = []
+    i = 0
+    for cart in partitions:
+        if ss[i : i + len(cart)] != cart:
+            dropped.append(ss[i])
+            i += 1
+        assert ss[i : i + len(cart)] == cart
+        i += len(cart)
+    return dropped + ss[i:]
+
+
+@pytest.mark.parametrize("cut_wait_moves", [False, True])
+def test_partition_rom27_dp(cut_wait_moves):
+    sequence = random_sequence(500)
+    params = dp_params(min_items_per_cart=3, cut_wait_moves=cut_wait_moves, dp_b=5)
+    partitions = partition_rom27_dp(sequence, params)
+
+    assert all(3 <= len(cart) <= 27 for cart in partitions)
+    dropped = dropped_moves(sequence, partitions)
+    if cut_wait_moves:
+        assert dropped and set(dropped) == {WAIT}
+    else:
+        assert not dropped
+
+    greedy = partition_rom27(sequence.ss_list, params)
+    assert estimate_read_time(partitions, 0, 5) <= estimate_read_time(greedy, 0, 5)
+
+
+def test_partition_rom27_dp_cut_waits_only():
+    sequence = Sequence([3] * 27 + [WAIT] + [7] * 27, WAIT)
+    partitions = partition_rom27_dp(sequence, dp_params(cut_wait_moves=True))
+    assert partitions == [[3] * 27, [7] * 27]
+
+
+def test_partition_rom27_dp_impossible():
+    with pytest.raises(ValueError):
+        partition_rom27_dp(Sequence([3] * 3, WAIT), dp_params(min_items_per_cart=4))
+
+
+@pytest.mark.parametrize("cut_wait_moves", [False, True])
+def test_layout_rom27_dp_min_carts(cut_wait_moves):
+    sequence = random_sequence(22)
+    params = dp_params(
+        min_carts=10, min_items_per_cart=3, cut_wait_moves=cut_wait_moves
+    )
+    carts = layout_rom27(sequence, params).carts
+    assert len(carts) == 10
+    assert all(3 <= len(cart) <= 27 for cart in carts)
+
+    if not cut_wait_moves:
+        greedy = params.model_copy(update={"partition": "greedy"})
+        assert len(layout_rom27(sequence, greedy).carts) == 10
+
+
+def test_partition_rom27_dp_no_empty_carts():
+    sequence = Sequence([3, 1, 1, 1, 5, 1, 1, 1, 1, 7], WAIT)
+    partitions = partition_rom27_dp(sequence, dp_params(cut_wait_moves=True))
+    assert partitions == [[3], [1], [5, 1], [1], [7]]
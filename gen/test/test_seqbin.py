@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from doors.hip.basic_hip import write_sequence
+from gen.params import parse_encoding, parse_sequence, read_sequence
+from gen.seqbin import HEADER, pack_sequence, unpack_sequence
+
+KEY = "1 wait\n5 a\n12 b\n15 c\n"
+MOVES = ["a", "wait", "b", "c", "c", "wait", "a"]
+
+
+@pytest.mark.parametrize("moves", [MOVES, MOVES[:-1], []])
+def test_roundtrip(moves):
+    key = parse_encoding(KEY)
+    ss = np.array([key[move] for move in moves], dtype=np.uint8)
+    data = pack_sequence(ss, key)
+    assert len(data) == HEADER.size + (len(moves) + 1) // 2
+
+    unpacked, wait_move = unpack_sequence(data, key)
+    assert unpacked.tolist() == ss.tolist()
+    assert wait_move == 1
+
+
+def test_no_wait_move():
+    key = parse_encoding("5 a\n")
+    _, wait_move = unpack_sequence(pack_sequence(np.array([5, 5]), key))
+    assert wait_move is None
+
+
+def test_key_mismatch():
+    data = pack_sequence(np.array([5]), parse_encoding(KEY))
+    with pytest.raises(ValueError):
+        parse_sequence("1 wait\n6 a\n", data)
+
+
+def test_read_door_sequence(tmp_path):
+    (tmp_path / "key.txt").write_text(KEY)
+    write_sequence(MOVES, str(tmp_path / "sequence.txt"))
+    text = read_sequence(str(tmp_path))
+
+    write_sequence(MOVES, str(tmp_path / "sequence.seqbin"))
+    binary = read_sequence(str(tmp_path))
+
+    assert (
+        binary.ss_list == text.ss_list == parse_sequence(KEY, "\n".join(MOVES)).ss_list
+    )
+    assert binary.wait_move == text.wait_move == 1
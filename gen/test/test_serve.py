@@ -0,0 +1,139 @@
+import asyncio
+import gzip
+import json
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from gen.params import Sequence, parse_params
+from gen.rom_gen import gen_rom_bytes
+from gen.serve import RomServer, read_frame, request_rom
+
+SS = [5, 1, 1, 12, 3, 1, 15] * 30
+PARAMS = {"rom_type": "cart27", "medium": "disc"}
+KEY = "1 wait\n5 push\n12 pull\n"
+
+
+def expected_nbt(params: dict = PARAMS) -> bytes:
+    rom = gen_rom_bytes(Sequence(SS, 1), parse_params(json.dumps(params)))
+    return gzip.decompress(rom)
+
+
+def run_with_server(client, unix_path: str | None = None, **kwargs):
+    """Start a server with thread workers, run `client(address)` in a thread."""
+
+    async def main():
+        server = RomServer(executor=ThreadPoolExecutor(2), **kwargs)
+        listener = await server.start(port=0, unix_path=unix_path)
+        address = unix_path or listener.sockets[0].getsockname()
+        try:
+            return server, await asyncio.to_thread(client, address)
+        finally:
+            listener.close()
+            await listener.wait_closed()
+            server.close()
+
+    return asyncio.run(main())
+
+
+def connect(address) -> socket.socket:
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX)
+    else:
+        sock = socket.socket()
+    sock.connect(address)
+    return sock
+
+
+def test_requests_and_cache():
+    def client(address):
+        with connect(address) as sock:
+            return [
+                request_rom(sock, {"ss": SS, "wait_move": 1, "params": PARAMS}),
+                request_rom(sock, {"ss": SS, "wait_move": 1, "params": PARAMS}),
+                request_rom(
+                    sock,
+                    {
+                        "ss": SS,
+                        "wait_move": 1,
+                        "params": PARAMS,
+                        "compression": {"gzipped": False},
+                    },
+                ),
+                request_rom(sock, {"ss": SS, "params": {"rom_type": "cart9"}}),
+                request_rom(sock, {"door": "../gen"}),
+            ]
+
+    server, responses = run_with_server(client)
+    (first, rom), (second, cached_rom), (raw, raw_rom), (bad, _), (door, _) = responses
+    assert first == {"ok": True, "carts": 8, "cached": False}
+    assert second["cached"] and cached_rom == rom
+    assert not raw["cached"] and raw_rom == gzip.decompress(rom) == expected_nbt()
+    assert not bad["ok"] and "ValidationError" in bad["error"]
+    assert not door["ok"] and "Unknown door" in door["error"]
+    # failed builds aren't cached, but still count
+    assert server.builds == 3
+
+
+def test_text_sequence_over_unix_socket(tmp_path):
+    moves = {1: "wait", 5: "push", 12: "pull", 3: "up", 15: "down"}
+    key = "".join(f"{ss} {name}\n" for ss, name in moves.items())
+    request = {
+        "key": key,
+        "sequence": "\n".join(moves[ss] for ss in SS),
+        "params": PARAMS,
+    }
+
+    def client(address):
+        with connect(address) as sock:
+            return request_rom(sock, request)
+
+    _, (header, rom) = run_with_server(client, str(tmp_path / "gen.sock"))
+    assert header["ok"]
+    assert gzip.decompress(rom) == expected_nbt()
+
+
+def test_concurrent_requests_share_a_build():
+    request = {"ss": SS * 20, "wait_move": 1, "params": {"rom_type": "cart1"}}
+
+    def client(address):
+        def one(_):
+            with connect(address) as sock:
+                return request_rom(sock, request)
+
+        with ThreadPoolExecutor(4) as pool:
+            return list(pool.map(one, range(4)))
+
+    server, responses = run_with_server(client)
+    assert server.builds == 1
+    assert all(header["ok"] for header, _ in responses)
+    assert len({rom for _, rom in responses}) == 1
+
+
+def test_lru_eviction():
+    def client(address):
+        with connect(address) as sock:
+            for min_carts in [1, 2, 3, 1]:
+                params = {"rom_type": "cart1", "min_carts": min_carts}
+                request_rom(sock, {"ss": SS, "params": params})
+
+    server, _ = run_with_server(client, cache_size=2)
+    # 1 was evicted by 3, so it was built twice
+    assert server.builds == 4
+    assert len(server.cache) == 2
+
+
+@pytest.mark.parametrize("body", [b"not json", b"[1, 2]"])
+def test_malformed_requests(body):
+    def client(address):
+        with connect(address) as sock:
+            sock.sendall(len(body).to_bytes(4, "big") + body)
+            error = json.loads(read_frame(sock))
+            assert read_frame(sock) == b""
+            return error, request_rom(sock, {"ss": SS, "params": PARAMS})
+
+    _, (error, (header, _)) = run_with_server(client)
+    assert not error["ok"]
+    # the connection stays usable after a bad request
+    assert header["ok"]
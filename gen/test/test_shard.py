@@ -0,0 +1,104 @@
+import json
+
+import nbtlib
+import pytest
+
+from gen.params import Sequence, parse_params
+from gen.rom_gen import gen_rom
+from gen.shard import (
+    Sharding,
+    index_path,
+    parse_sharding,
+    save_sharded_rom,
+    shard_bounds,
+    split_carts,
+)
+
+SEQUENCE = Sequence([5, 1, 1, 12, 3, 1, 15] * 100, wait_move=1)
+
+
+def test_parse_sharding():
+    assert parse_sharding("4") == Sharding("shards", 4)
+    assert parse_sharding("carts:500") == Sharding("carts", 500)
+    assert parse_sharding("bytes:2M", (0, 3, 0)) == Sharding(
+        "bytes", 2 * 2**20, (0, 3, 0)
+    )
+    for spec in ["entities:3", "carts:2k", "0", "bytes:"]:
+        with pytest.raises(ValueError):
+            parse_sharding(spec)
+
+
+def test_shard_bounds():
+    sizes = [10, 10, 30, 10, 50, 10, 10]
+    assert shard_bounds(sizes, Sharding("shards", 3)) == [(0, 3), (3, 5), (5, 7)]
+    assert shard_bounds(sizes, Sharding("shards", 20)) == [(i, i + 1) for i in range(7)]
+    assert shard_bounds(sizes, Sharding("carts", 3)) == [(0, 3), (3, 6), (6, 7)]
+    # the 50 byte cart is over the limit, so it gets a shard of its own
+    assert shard_bounds(sizes, Sharding("bytes", 40)) == [
+        (0, 2),
+        (2, 4),
+        (4, 5),
+        (5, 7),
+    ]
+    assert shard_bounds([], Sharding("bytes", 40)) == [(0, 0)]
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        '{"rom_type": "cart1"}',
+        '{"rom_type": "cart26", "medium": "disc", "origin": [1, 2, 3]}',
+    ],
+)
+def test_save_sharded_rom(tmp_path, params):
+    rom_params = parse_params(params)
+    out_path = str(tmp_path / "rom.schem")
+    expected = gen_rom(SEQUENCE, rom_params)["Schematic"]
+
+    save_sharded_rom(SEQUENCE, rom_params, out_path, Sharding("shards", 5, (0, 4, 0)))
+    with open(index_path(out_path)) as f:
+        index = json.load(f)
+    assert len(index["shards"]) == 5
+
+    entities = []
+    for i, shard in enumerate(index["shards"]):
+        schem = nbtlib.load(tmp_path / shard["file"])["Schematic"]
+        start, stop = shard["carts"]
+        assert len(schem["Entities"]) == stop - start
+        base = expected["Metadata"]["WorldEdit"]["Origin"]
+        origin = [base[0], base[1] + 4 * i, base[2]]
+        assert shard["origin"] == origin
+        assert list(schem["Metadata"]["WorldEdit"]["Origin"]) == origin
+        entities += schem["Entities"]
+    assert entities == expected["Entities"]
+
+    # fewer shards, so the old ones past the new last shard are removed
+    save_sharded_rom(SEQUENCE, rom_params, out_path, Sharding("shards", 2))
+    assert sorted(p.name for p in tmp_path.glob("*.schem")) == [
+        "rom.0.schem",
+        "rom.1.schem",
+    ]
+
+
+def test_split_carts_streams():
+    consumed = []
+
+    def carts():
+        for i in range(7):
+            consumed.append(i)
+            yield bytes(i + 1)
+
+    shards = split_carts(carts(), 7, Sharding("carts", 3))
+    num_carts, shard = next(shards)
+    assert num_carts == 3 and consumed == []
+    assert list(shard) == [bytes(1), bytes(2), bytes(3)]
+    assert [(n, len(list(s))) for n, s in shards] == [(3, 3), (1, 1)]
+
+    shards = split_carts(carts(), 7, Sharding("bytes", 6))
+    assert [[len(cart) for cart in s] for _, s in shards] == [
+        [1, 2, 3],
+        [4],
+        [5],
+        [6],
+        [7],
+    ]
@@ -0,0 +1,45 @@
+import gzip
+import time
+
+from gen.params import Sequence, parse_params
+from gen.rom_gen import save_rom
+from gen.timing import Profiler, profiling, stage
+
+
+def test_nested_stages_count_own_time(monkeypatch):
+    # a clock that only moves when told to, so the test doesn't depend on machine load
+    now = [0.0]
+    monkeypatch.setattr(time, "perf_counter", lambda: now[0])
+    profiler = Profiler()
+    with profiler.stage("outer"):
+        now[0] += 2
+        with profiler.stage("inner"):
+            now[0] += 5
+        now[0] += 1
+    assert profiler.stages["outer"].wall == 3
+    assert profiler.stages["inner"].wall == 5
+    assert profiler.stages["outer"].calls == profiler.stages["inner"].calls == 1
+
+
+def test_stage_without_profiling():
+    with stage("partition"):
+        pass
+
+
+def test_profiled_save_rom(tmp_path):
+    sequence = Sequence([5, 1, 1, 12, 3, 1, 15] * 50, wait_move=1)
+    params = parse_params('{"rom_type": "cart27", "medium": "disc"}')
+    save_rom(sequence, params, str(tmp_path / "plain.schem"))
+
+    cprofile_path = tmp_path / "build.prof"
+    with profiling(str(cprofile_path)) as profiler:
+        save_rom(sequence, params, str(tmp_path / "profiled.schem"))
+    assert {"partition", "encode", "assemble", "compress", "write"} <= set(
+        profiler.stages
+    )
+    assert "total" in profiler.report()
+    assert cprofile_path.stat().st_size
+
+    with gzip.open(tmp_path / "plain.schem") as plain:
+        with gzip.open(tmp_path / "profiled.schem") as profiled:
+            assert plain.read() == profiled.read()
@@ -0,0 +1,59 @@
+import os
+
+from gen.watch import Watcher
+
+KEY = "1 wait\n5 push\n12 pull\n"
+GENERATOR = """
+import os
+
+MOVES = {moves!r}
+
+if __name__ == "__main__":
+    with open(os.path.join("door_meta", "door", "sequence.txt"), "w") as f:
+        f.write("\\n".join(MOVES))
+"""
+
+
+def write_generator(tmp_path, moves: list[str]):
+    source = tmp_path / "watch_test_generator.py"
+    source.write_text(GENERATOR.format(moves=moves))
+    # make sure the change is seen even within the file system's timestamp resolution
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def test_watcher(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    info_dir = tmp_path / "door_meta" / "door"
+    info_dir.mkdir(parents=True)
+    (info_dir / "key.txt").write_text(KEY)
+    (info_dir / "params.json").write_text('{"rom_type": "cart1"}')
+    write_generator(tmp_path, ["push", "wait", "pull"])
+
+    out_path = tmp_path / "out" / "rom.schem"
+    messages = []
+    watcher = Watcher(
+        "door",
+        "door_meta/door",
+        str(out_path),
+        "watch_test_generator",
+        echo=lambda *args, **kwargs: messages.append(" ".join(args)),
+    )
+    assert watcher.poll()
+    assert "Wrote 4 carts" in messages[-1]
+    assert not watcher.poll()
+
+    # the generator is reloaded from its new source
+    write_generator(tmp_path, ["push", "wait", "pull", "pull"])
+    assert watcher.poll()
+    assert messages[-2].startswith("Ran sequence generator")
+    assert "Wrote 5 carts" in messages[-1]
+
+    # a params change only rebuilds the ROM
+    seen = len(messages)
+    (info_dir / "params.json").write_text('{"rom_type": "cart1", "min_carts": 10}')
+    os.utime(info_dir / "params.json", ns=(0, 2 * 10**18))
+    assert watcher.poll()
+    assert len(messages) == seen + 1
+    assert "Wrote 11 carts" in messages[-1]
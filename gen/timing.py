@@ -0,0 +1,175 @@
+"""
+Per-stage wall clock and CPU times of a build, for `python -m gen build --profile`.
+
+Build code marks its stages with `stage(name)`, which does nothing unless a `profiling()`
+block is active. Stages can nest, and each one only counts its own time: time spent in
+a nested stage is taken off the stage around it. Stages that run interleaved, like the
+lazy cart encoders feeding the schematic writer, are separated with `timed_iter` and
+`TimedWriter`.
+"""
+
+import time
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Iterable, Iterator, Self
+
+if TYPE_CHECKING:
+    from gen.compress import Writer
+
+# stages in build order, for the report
+STAGES = [
+    "import",
+    "read",
+    "parse_sequence",
+    "parse_params",
+    "partition",
+    "encode",
+    "assemble",
+    "compress",
+    "write",
+]
+
+
+@dataclass
+class StageTimes:
+    wall: float = 0
+    cpu: float = 0
+    calls: int = 0
+
+
+class Profiler:
+    def __init__(self):
+        self.stages: dict[str, StageTimes] = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+        # [wall, cpu] of nested stages, for each open stage
+        self._nested: list[list[float]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        self._nested.append([0.0, 0.0])
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            nested_wall, nested_cpu = self._nested.pop()
+            if self._nested:
+                self._nested[-1][0] += wall
+                self._nested[-1][1] += cpu
+            times = self.stages.setdefault(name, StageTimes())
+            times.wall += wall - nested_wall
+            times.cpu += cpu - nested_cpu
+            times.calls += 1
+
+    def report(self) -> str:
+        names = [name for name in STAGES if name in self.stages]
+        names += sorted(set(self.stages) - set(STAGES))
+        rows = [(name, self.stages[name]) for name in names]
+        other = StageTimes(
+            self.wall - sum(times.wall for _, times in rows),
+            self.cpu - sum(times.cpu for _, times in rows),
+        )
+        rows.append(("other", other))
+
+        lines = [f"{'stage':<16}{'wall ms':>10}{'cpu ms':>10}{'wall %':>8}{'calls':>8}"]
+        for name, times in rows + [("total", StageTimes(self.wall, self.cpu))]:
+            share = 100 * times.wall / self.wall if self.wall else 0
+            lines.append(
+                f"{name:<16}{times.wall * 1000:10.1f}{times.cpu * 1000:10.1f}"
+                f"{share:8.1f}{times.calls or '':>8}"
+            )
+        return "\n".join(lines)
+
+
+_active: Profiler | None = None
+
+
+def stage(name: str):
+    """Count the time spent in this block towards stage `name`, when profiling."""
+    if _active is None:
+        return nullcontext()
+    return _active.stage(name)
+
+
+def timed_iter[T](name: str, items: Iterable[T]) -> Iterable[T]:
+    """`items`, counting the time spent producing each one towards stage `name`."""
+    if _active is None:
+        return items
+    return _timed_iter(_active, name, items)
+
+
+def _timed_iter[T](profiler: Profiler, name: str, items: Iterable[T]) -> Iterator[T]:
+    it = iter(items)
+    while True:
+        try:
+            with profiler.stage(name):
+                item = next(it)
+        except StopIteration:
+            return
+        yield item
+
+
+class TimedWriter:
+    """Binary file wrapper counting the time spent in `write` and `close` towards a stage."""
+
+    def __init__(self, fileobj: "Writer", name: str, profiler: Profiler):
+        self._fileobj = fileobj
+        self._name = name
+        self._profiler = profiler
+
+    def write(self, data) -> int:
+        with self._profiler.stage(self._name):
+            return self._fileobj.write(data)
+
+    def flush(self):
+        with self._profiler.stage(self._name):
+            self._fileobj.flush()
+
+    def close(self):
+        with self._profiler.stage(self._name):
+            self._fileobj.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __getattr__(self, attr):
+        return getattr(self._fileobj, attr)
+
+
+def active_profiler() -> Profiler | None:
+    return _active
+
+
+@contextmanager
+def profiling(cprofile_path: str | None = None) -> Iterator[Profiler]:
+    """
+    Collect stage times for everything run in this block. With `cprofile_path`, the
+    block also runs under cProfile, and its stats are dumped there for pstats.
+    """
+    global _active
+    profiler = Profiler()
+    cprofiler = None
+    if cprofile_path:
+        import cProfile
+
+        cprofiler = cProfile.Profile()
+
+    _active = profiler
+    wall, cpu = time.perf_counter(), time.process_time()
+    if cprofiler:
+        cprofiler.enable()
+    try:
+        yield profiler
+    finally:
+        if cprofiler:
+            cprofiler.disable()
+        profiler.wall = time.perf_counter() - wall
+        profiler.cpu = time.process_time() - cpu
+        _active = None
+        if cprofiler and cprofile_path:
+            cprofiler.dump_stats(cprofile_path)
@@ -0,0 +1,114 @@
+"""
+Watch mode, rebuilding a door's ROM whenever its generator or inputs change.
+
+One process keeps numpy, pydantic, nbtlib and the ROM code loaded between builds. Files
+are polled for changed modification times, then the same content hashes as incremental
+builds decide what to rerun: the sequence generator if its source changed, after
+reloading the door modules it imports, then the ROM if its inputs changed.
+"""
+
+import os
+import sys
+import time
+import traceback
+from os import path
+
+from gen.build import (
+    DOOR_FILES,
+    build_rom_incremental,
+    record_generator,
+    run_generator,
+)
+from gen.compress import Compression
+from gen.manifest import Manifest, generator_hash, module_sources, sequence_file
+
+
+class Watcher:
+    def __init__(
+        self,
+        door: str,
+        info_dir: str,
+        out_path: str,
+        module: str | None,
+        compression: Compression = Compression(),
+        echo=print,
+    ):
+        self.door = door
+        self.info_dir = info_dir
+        self.out_path = out_path
+        self.module = module
+        self.compression = compression
+        self.echo = echo
+        self._mtimes: dict[str, float] | None = None
+
+    def watched_files(self) -> list[str]:
+        files = [path.join(self.info_dir, file) for file in DOOR_FILES]
+        files.append(sequence_file(self.info_dir))
+        if self.module:
+            files += module_sources(self.module)
+        return files
+
+    def _current_mtimes(self) -> dict[str, float]:
+        mtimes = {}
+        for file in self.watched_files():
+            try:
+                mtimes[file] = os.stat(file).st_mtime_ns
+            except FileNotFoundError:
+                pass
+        return mtimes
+
+    def poll(self) -> bool:
+        """Rebuild if any watched file changed since the last poll. Returns whether it did."""
+        mtimes = self._current_mtimes()
+        if mtimes == self._mtimes:
+            return False
+        try:
+            self.rebuild()
+        except Exception:
+            self.echo(traceback.format_exc(), end="")
+        # don't rebuild again for the sequence the generator just wrote
+        self._mtimes = self._current_mtimes()
+        return True
+
+    def rebuild(self):
+        start = time.perf_counter()
+        module = self.module
+        if module:
+            digest = generator_hash(module)
+            if Manifest.load(self.door).generator != digest:
+                self.run_generator(module)
+                record_generator(module, digest)
+                manifest = Manifest.load(self.door)
+                manifest.generator = digest
+                manifest.save()
+                self.echo(f"Ran sequence generator {module}")
+
+        stats = build_rom_incremental(
+            self.info_dir, self.out_path, compression=self.compression
+        )
+        seconds = time.perf_counter() - start
+        if stats is None:
+            self.echo(f"Up to date: {path.abspath(self.out_path)}")
+        else:
+            self.echo(
+                f"Wrote {stats['carts']} carts to {path.abspath(self.out_path)}"
+                f" in {seconds:.2f}s"
+            )
+
+    def run_generator(self, module: str):
+        # forget the generator's door modules, so they are imported again from their
+        # current source while everything else stays loaded
+        sources = set(module_sources(module))
+        for name, loaded in list(sys.modules.items()):
+            if getattr(loaded, "__file__", None) in sources and name != "doors":
+                del sys.modules[name]
+        run_generator(module)
+
+    def run(self, interval: float = 0.2):
+        self.echo(f"Watching {self.door}, press Ctrl-C to stop.")
+        try:
+            while True:
+                self.poll()
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass